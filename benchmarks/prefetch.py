@@ -0,0 +1,75 @@
+"""
+Benchmark background batch prefetching (Trainer(prefetch=k)) on CPU.
+
+Trains a small MLP on a StaticDataset loaded by a DataLoader which collates batches sample by sample,
+optionally with noise augmentation as batch transform, and reports the time per epoch for each prefetch depth.
+Prefetching only pays off when preparing a batch takes a significant share of the time of a training step.
+
+    python benchmarks/prefetch.py --samples 20000 --batch-size 256 --depths 0 1 2 4
+"""
+import argparse
+import time
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+
+from neuromancer import blocks
+from neuromancer.component import Function
+from neuromancer.dataset import StaticDataset
+from neuromancer.loggers import BasicLogger
+from neuromancer.problem import Problem, MSELoss
+from neuromancer.trainer import Trainer
+
+
+def get_loader(nsamples, nx, ny, batch_size, name):
+    data = {'x': np.random.rand(nsamples, nx), 'y': np.random.rand(nsamples, ny)}
+    dataset = StaticDataset(data, name=name)
+    return DataLoader(dataset, batch_size=batch_size, shuffle=True, collate_fn=dataset.collate_fn)
+
+
+def add_noise(batch):
+    return {**batch, 'x': batch['x'] + 0.01 * torch.randn_like(batch['x'])}
+
+
+def time_training(args, depth):
+    torch.manual_seed(0)
+    np.random.seed(0)
+    func = Function(blocks.MLP(args.nx, args.ny, hsizes=[args.hsize] * 2), input_keys=['x'], output_keys=['fx'],
+                    name='mlp')
+    problem = Problem([MSELoss(['fx_mlp', 'y'])], [], [func])
+    train_data = get_loader(args.samples, args.nx, args.ny, args.batch_size, 'train')
+    dev_data = get_loader(args.batch_size, args.nx, args.ny, args.batch_size, 'dev')
+    trainer = Trainer(
+        problem, train_data, dev_data, dev_data, torch.optim.Adam(problem.parameters(), lr=1e-3),
+        logger=BasicLogger(savedir=args.savedir, verbosity=args.epochs + 1, stdout=()),
+        train_metric='train_loss', dev_metric='dev_loss', test_metric='dev_loss', eval_metric='dev_loss',
+        epochs=args.epochs, patience=args.epochs, prefetch=depth,
+        prefetch_transform=add_noise if args.noise else None,
+    )
+    start = time.perf_counter()
+    trainer.train()
+    return (time.perf_counter() - start) / args.epochs
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--samples', type=int, default=20000, help='Number of training samples')
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--nx', type=int, default=32, help='Input dimension')
+    parser.add_argument('--ny', type=int, default=8, help='Output dimension')
+    parser.add_argument('--hsize', type=int, default=128, help='Hidden layer size of the MLP')
+    parser.add_argument('--epochs', type=int, default=3)
+    parser.add_argument('--depths', type=int, nargs='+', default=[0, 1, 2, 4], help='Prefetch depths to compare')
+    parser.add_argument('--noise', action='store_true', help='Add noise to training batches in the prefetch stage')
+    parser.add_argument('--num-threads', type=int, default=None, help='Number of torch intra-op threads')
+    parser.add_argument('--savedir', type=str, default='bench_prefetch')
+    args = parser.parse_args()
+    if args.num_threads is not None:
+        torch.set_num_threads(args.num_threads)
+
+    baseline = None
+    for depth in args.depths:
+        epoch_time = time_training(args, depth)
+        baseline = baseline or epoch_time
+        print(f'prefetch={depth}: {epoch_time:.3f}s per epoch, speedup {baseline / epoch_time:.2f}x')
@@ -0,0 +1,49 @@
+"""
+Benchmark splitting data by experiment ID (neuromancer.dataset._split_by_id) against one boolean mask per ID.
+
+Times experiments stored as contiguous blocks of rows, which are split into views, and experiments with
+interleaved rows, which are reordered once by a stable argsort.
+
+    python benchmarks/split_by_id.py --experiments 10000 --rows 5
+"""
+import argparse
+import time
+
+import numpy as np
+
+from neuromancer.dataset import _split_by_id
+
+
+def split_by_masks(data, id_):
+    ids = id_.flatten()
+    return [{k: v[ids == i, ...] for k, v in data.items()} for i in sorted(set(ids))]
+
+
+def best_time(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--experiments', type=int, default=10000, help='Number of experiment IDs')
+    parser.add_argument('--rows', type=int, default=5, help='Rows per experiment')
+    parser.add_argument('--repeats', type=int, default=3, help='Timing repeats; the best is reported')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    contiguous = np.repeat(rng.permutation(args.experiments), args.rows)
+    layouts = {'contiguous': contiguous, 'interleaved': rng.permutation(contiguous)}
+    data = {'Y': rng.random((len(contiguous), 2)), 'U': rng.random((len(contiguous), 1))}
+
+    for name, ids in layouts.items():
+        ids = ids.reshape(-1, 1)
+        new_time, split = best_time(lambda: _split_by_id(data, ids), args.repeats)
+        old_time, expected = best_time(lambda: split_by_masks(data, ids), args.repeats)
+        assert all(np.array_equal(d1[k], d2[k]) for d1, d2 in zip(split, expected) for k in data)
+        print(f'{name}: split by id {new_time:.4f}s, per-ID masks {old_time:.4f}s, '
+              f'speedup {old_time / new_time:.1f}x')
@@ -77,12 +77,20 @@ class ArgParser(ArgumentParser):
         """
         args = self.parse_args()
         print(args)
+        return args, self.arg_groups(args)
+
+    def arg_groups(self, args):
+        """
+        Split a Namespace of all arguments into a Namespace for each argument group
+
+        :param args: (Namespace) e.g. returned by parse_args
+        :return: (dict, {str: Namespace})
+        """
         arg_groups = {}
-    
         for group in self._action_groups:
             group_dict = {a.dest: getattr(args, a.dest, None) for a in group._group_actions}
             arg_groups[group.title] = argparse.Namespace(**group_dict)
-        return args, arg_groups
+        return arg_groups
 
 
 def log(prefix=''):
@@ -1,3 +1,7 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+import hashlib
+import json
 import math
 import os
 import warnings
@@ -6,7 +10,12 @@ import numpy as np
 import pandas as pd
 from scipy.io import loadmat
 import torch
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import (
+    Dataset,
+    IterableDataset,
+    DataLoader,
+    Sampler,
+)
 from torch.utils.data.dataloader import default_collate
 
 
@@ -25,17 +34,79 @@ def _extract_var(data, regex):
 
 SUPPORTED_EXTENSIONS = {".csv", ".mat"}
 
+MEMMAP_DATA_FILE = "data.npy"
+MEMMAP_META_FILE = "meta.json"
 
-def read_file(file_or_dir):
+
+def read_file(file_or_dir, cache_dir=None, workers=None):
+    """Read data from a MAT or CSV file, or from every MAT and CSV file in a directory, into data
+    dictionaries.
+
+    :param file_or_dir: (str) path to a MAT or CSV file, or to a directory of such files.
+    :param cache_dir: (str) optional directory in which to cache parsed data. Each file is cached
+        under its path and is only parsed again if its modification time or size changes, so
+        files added to a directory are parsed once and unchanged files are loaded from the cache.
+    :param workers: (int) optional number of processes in which to read the files of a directory.
+        Files are returned in sorted order either way. Default None reads files one at a time in
+        the calling process.
+    """
     if os.path.isdir(file_or_dir):
-        files = [
+        files = sorted(
             os.path.join(file_or_dir, x)
             for x in os.listdir(file_or_dir)
             if os.path.splitext(x)[1].lower() in SUPPORTED_EXTENSIONS
-        ]
-        return [_read_file(x) for x in sorted(files)]
+        )
+        if workers:
+            with ProcessPoolExecutor(workers) as pool:
+                return list(pool.map(partial(_load_file, cache_dir=cache_dir), files))
+        return [_load_file(x, cache_dir) for x in files]
+
+    return _load_file(file_or_dir, cache_dir)
+
+
+def _load_file(file_path, cache_dir=None):
+    """Read data from a MAT or CSV file, going through the cache in `cache_dir` if given.
+
+    :param file_path: (str) path to a MAT or CSV file to load.
+    :param cache_dir: (str) directory of cached data, or None to always parse the file.
+    """
+    if cache_dir is None:
+        return _read_file(file_path)
+
+    stat = os.stat(file_path)
+    key = hashlib.sha1(os.path.abspath(file_path).encode()).hexdigest()
+    cache_path = os.path.join(cache_dir, f"{key}.npz")
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as cached:
+            if int(cached["mtime"]) == stat.st_mtime_ns and int(cached["size"]) == stat.st_size:
+                return _unpack_cached_data(cached)
+
+    data = _read_file(file_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, mtime=stat.st_mtime_ns, size=stat.st_size, **_pack_cached_data(data))
+    os.replace(tmp_path, cache_path)
+    return data
+
+
+def _pack_cached_data(data):
+    if isinstance(data, dict):
+        return {"nexp": -1, **data}
+    return {
+        "nexp": len(data),
+        **{f"{k}_{i}": v for i, d in enumerate(data) for k, v in d.items()},
+    }
 
-    return _read_file(file_or_dir)
+
+def _unpack_cached_data(cached):
+    nexp = int(cached["nexp"])
+    if nexp < 0:
+        return {k: cached[k] for k in ["Y", "X", "U", "D"] if k in cached.files}
+    return [
+        {k: cached[f"{k}_{i}"] for k in ["Y", "X", "U", "D"] if f"{k}_{i}" in cached.files}
+        for i in range(nexp)
+    ]
 
 
 def _read_file(file_path):
@@ -63,15 +134,34 @@ def _read_file(file_path):
 
     assert any([v is not None for v in [Y, X, U, D]])
 
-    if id_ is None:
-        return {
-            k: v for k, v in zip(["Y", "X", "U", "D"], [Y, X, U, D]) if v is not None
-        }
-    else:
-        return [
-            {k: v[id_.flatten() == i, ...] for k, v in zip(["Y", "X", "U", "D"], [Y, X, U, D]) if v is not None}
-            for i in sorted(set(id_.flatten()))
-        ]
+    data = {
+        k: v for k, v in zip(["Y", "X", "U", "D"], [Y, X, U, D]) if v is not None
+    }
+    return data if id_ is None else _split_by_id(data, id_)
+
+
+def _split_by_id(data, id_):
+    """Split a data dictionary into one dictionary per experiment ID, ordered by ID. Rows of each
+    experiment keep their original order. When every experiment occupies a contiguous block of
+    rows the split arrays are views of the given arrays; otherwise each array is reordered once.
+
+    :param data: (dict str: np.array) data dictionary.
+    :param id_: (np.array) experiment ID of each row of data.
+    """
+    ids = id_.flatten()
+    if ids.size == 0:
+        return []
+    starts = np.concatenate([[0], np.flatnonzero(ids[1:] != ids[:-1]) + 1])
+    run_ids = ids[starts]
+    if len(np.unique(run_ids)) != len(run_ids):
+        order = np.argsort(ids, kind="stable")
+        data = {k: v[order, ...] for k, v in data.items()}
+        run_ids, starts = np.unique(ids[order], return_index=True)
+    stops = np.append(starts[1:], len(ids))
+    return [
+        {k: v[starts[i]:stops[i], ...] for k, v in data.items()}
+        for i in np.argsort(run_ids, kind="stable")
+    ]
 
 
 def batch_tensor(x: torch.Tensor, steps: int, mh: bool = False):
@@ -102,6 +192,10 @@ def _get_sequence_time_slices(data):
     return slices
 
 
+def _is_index_batch(i):
+    return isinstance(i, (list, tuple)) or (isinstance(i, (np.ndarray, torch.Tensor)) and i.ndim > 0)
+
+
 def _validate_keys(data):
     keys = set(data[0].keys())
     for d in data[1:]:
@@ -119,6 +213,7 @@ class SequenceDataset(Dataset):
         nsteps=1,
         moving_horizon=False,
         name="data",
+        lazy=None,
     ):
         """Dataset for handling sequential data and transforming it into the dictionary structure
         used by NeuroMANCER models.
@@ -129,6 +224,9 @@ class SequenceDataset(Dataset):
         :param moving_horizon: (bool) if True, generate batches using sliding window with stride 1;
             else use stride N.
         :param name: (str) name of dataset split.
+        :param lazy: (bool) if True, N-step windows are gathered from `full_data` when fetched rather
+            than stored in `batched_data`, so memory use does not grow with N. Default is None, in
+            which case windows are generated lazily only when `moving_horizon` is True.
 
         .. note:: To generate train/dev/test datasets and DataLoaders for each, see the
             `get_sequence_dataloaders` function.
@@ -137,7 +235,6 @@ class SequenceDataset(Dataset):
             provided to PyTorch's DataLoader class; see the `collate_fn` method of this class.
 
         .. todo:: Add support for categorical features.
-        .. todo:: Add support for memory-mapped and/or streaming data.
         .. todo:: Add support for data augmentation?
         .. todo:: Clean up data validation code.
         """
@@ -153,21 +250,80 @@ class SequenceDataset(Dataset):
             data = [data]
 
         keys = _validate_keys(data)
+        variables = list(keys)
+        full_data = torch.cat(
+            [torch.cat([torch.tensor(d[k], dtype=torch.float) for k in variables], dim=1) for d in data],
+            dim=0,
+        )
+        self._build(
+            full_data,
+            {k: data[0][k].shape[1] for k in variables},
+            _get_sequence_time_slices(data),
+            nsteps,
+            moving_horizon,
+            lazy,
+        )
 
+    @classmethod
+    def from_tensor(
+        cls,
+        full_data,
+        var_dims,
+        sslices,
+        nsteps=1,
+        moving_horizon=False,
+        name="data",
+        multisequence=False,
+        lazy=None,
+    ):
+        """Create a dataset directly from a tensor of concatenated data without copying it, e.g. from
+        a view of a range of time steps of a larger tensor.
+
+        :param full_data: (torch.Tensor) tensor of shape (T, D) holding all variables concatenated
+            along the feature dimension and all sequences concatenated along the time dimension.
+        :param var_dims: (dict str: int) ordered mapping of variable names to their dimensionality.
+        :param sslices: (list slice) time slices of each sequence in `full_data`.
+        :param nsteps: (int) N-step prediction horizon for batching data.
+        :param moving_horizon: (bool) if True, generate batches using sliding window with stride 1;
+            else use stride N.
+        :param name: (str) name of dataset split.
+        :param multisequence: (bool) whether the dataset holds a list of sequences.
+        :param lazy: (bool) if True, gather N-step windows from `full_data` when fetched; see
+            `SequenceDataset`.
+        """
+        dataset = cls.__new__(cls)
+        super(SequenceDataset, dataset).__init__()
+        dataset.name = name
+        dataset.multisequence = multisequence
+        dataset._build(full_data, var_dims, sslices, nsteps, moving_horizon, lazy)
+        return dataset
+
+    def _build(self, full_data, var_dims, sslices, nsteps, moving_horizon, lazy=None):
+        """Set up slicing and batching of data given a single tensor holding all sequences.
+
+        :param full_data: (torch.Tensor) tensor of shape (T, D) holding all variables concatenated
+            along the feature dimension and all sequences concatenated along the time dimension.
+        :param var_dims: (dict str: int) ordered mapping of variable names to their dimensionality.
+        :param sslices: (list slice) time slices of each sequence in `full_data`.
+        :param nsteps: (int) N-step prediction horizon for batching data.
+        :param moving_horizon: (bool) if True, generate batches using sliding window with stride 1;
+            else use stride N.
+        :param lazy: (bool) if True, gather N-step windows from `full_data` when fetched; default
+            None generates windows lazily only when `moving_horizon` is True.
+        """
         # _sslices used to slice out sequences from a multi-sequence dataset
-        self._sslices = _get_sequence_time_slices(data)
+        self._sslices = sslices
         assert all([nsteps < (sl.stop - sl.start) for sl in self._sslices]), \
             f"length of time series data must be greater than nsteps"
 
         self.nsteps = nsteps
+        self.moving_horizon = moving_horizon
+        self.lazy = moving_horizon if lazy is None else lazy
 
-        self.variables = list(keys)
-        self.full_data = torch.cat(
-            [torch.cat([torch.tensor(d[k], dtype=torch.float) for k in self.variables], dim=1) for d in data],
-            dim=0,
-        )
+        self.variables = list(var_dims.keys())
+        self.full_data = full_data
         self.nsim = self.full_data.shape[0]
-        self.dims = {k: (self.nsim, *data[0][k].shape[1:],) for k in self.variables}
+        self.dims = {k: (self.nsim, v,) for k, v in var_dims.items()}
 
         # _vslices used to slice out sequences of individual variables from full_data and batched_data
         i = 0
@@ -184,29 +340,65 @@ class SequenceDataset(Dataset):
             "nsteps": nsteps,
         }
 
-        self.batched_data = torch.cat(
-            [batch_tensor(self.full_data[s, ...] , nsteps, mh=moving_horizon) for s in self._sslices],
-            dim=0,
-        )
-        self.batched_data = self.batched_data.permute(0, 2, 1)
+        # _starts holds the time index in full_data at which each N-step window begins
+        stride = 1 if moving_horizon else nsteps
+        self._starts = torch.cat([torch.arange(s.start, s.stop - nsteps + 1, stride) for s in self._sslices])
+        self._offsets = torch.arange(nsteps)
+
+        if self.lazy:
+            self.batched_data = None
+        else:
+            # a single sequence is batched as a view of full_data; only multiple sequences are copied
+            batched_data = [batch_tensor(self.full_data[s, ...], nsteps, mh=moving_horizon) for s in self._sslices]
+            self.batched_data = batched_data[0] if len(batched_data) == 1 else torch.cat(batched_data, dim=0)
+            self.batched_data = self.batched_data.permute(0, 2, 1)
+
+    def _windows(self, idx):
+        """Fetch N-step windows of shape (..., N, D) by window index, from `batched_data` if it has
+        been materialized and from `full_data` otherwise.
+
+        :param idx: (int, slice, or torch.Tensor) window indices.
+        """
+        if self.batched_data is not None:
+            return self.batched_data[idx]
+        return self.full_data[self._starts[idx].unsqueeze(-1) + self._offsets]
 
     def __len__(self):
         """Gives the number of N-step batches in the dataset."""
-        return len(self.batched_data) - 1
+        return len(self._starts) - 1
 
     def __getitem__(self, i):
-        """Fetch a single N-step sequence from the dataset."""
+        """Fetch a single N-step sequence from the dataset, or a collated batch of N-step sequences
+        if given a collection of indices (see `get_batch`)."""
+        if _is_index_batch(i):
+            return self.get_batch(i)
+        past, future = self._windows(i), self._windows(i + 1)
         return {
             **{
-                k + "p": self.batched_data[i, :, self._vslices[k]]
+                k + "p": past[:, self._vslices[k]]
                 for k in self.variables
             },
             **{
-                k + "f": self.batched_data[i + 1, :, self._vslices[k]]
+                k + "f": future[:, self._vslices[k]]
                 for k in self.variables
             },
         }
 
+    def get_batch(self, idx):
+        """Fetch a batch of N-step sequences with a single indexing operation. The result is
+        identical to collating the samples `[self[i] for i in idx]` with `collate_fn`.
+
+        :param idx: (list int, np.array, or torch.Tensor) indices of the N-step sequences in the batch.
+        """
+        idx = torch.as_tensor(idx, dtype=torch.long)
+        past = self._windows(idx).transpose(0, 1)
+        future = self._windows(idx + 1).transpose(0, 1)
+        return {
+            **{k + "p": past[:, :, self._vslices[k]] for k in self.variables},
+            **{k + "f": future[:, :, self._vslices[k]] for k in self.variables},
+            "name": "nstep_" + self.name,
+        }
+
     def _get_full_sequence_impl(self, start=0, end=None):
         """Returns the full sequence of data as a dictionary. Useful for open-loop evaluation.
         """
@@ -235,13 +427,14 @@ class SequenceDataset(Dataset):
         )
 
     def get_full_batch(self):
+        past, future = self._windows(slice(None, -1)), self._windows(slice(1, None))
         return {
             **{
-                k + "p": self.batched_data[:-1, :, self._vslices[k]].transpose(0, 1)
+                k + "p": past[:, :, self._vslices[k]].transpose(0, 1)
                 for k in self.variables
             },
             **{
-                k + "f": self.batched_data[1:, :, self._vslices[k]].transpose(0, 1)
+                k + "f": future[:, :, self._vslices[k]].transpose(0, 1)
                 for k in self.variables
             },
             "name": "nstep_" + self.name,
@@ -275,6 +468,219 @@ class SequenceDataset(Dataset):
         )
 
 
+class MemmapSequenceDataset(SequenceDataset):
+    def __init__(
+        self,
+        path,
+        nsteps=1,
+        moving_horizon=False,
+        name="data",
+        lazy=None,
+    ):
+        """Sequence dataset backed by an on-disk store written with `write_memmap`. The store is
+        memory-mapped rather than loaded, so data is paged in from disk only when samples are
+        fetched; batches and full sequences are views of the mapped file or are gathered from it
+        when fetched, and are never copied as a whole.
+
+        :param path: (str) directory of a store written with `write_memmap`.
+        :param nsteps: (int) N-step prediction horizon for batching data.
+        :param moving_horizon: (bool) if True, generate batches using sliding window with stride 1;
+            else use stride N.
+        :param name: (str) name of dataset split.
+        :param lazy: (bool) if True, gather N-step windows from the store when fetched. Default is
+            None, in which case windows are gathered lazily for moving horizon batching and for
+            multi-sequence stores, the cases in which `batched_data` would otherwise be a copy.
+
+        .. note:: The store is opened copy-on-write, so in-place modification of the dataset's
+            tensors never writes back to disk.
+        """
+        super(SequenceDataset, self).__init__()
+        self.name = name
+        self.path = path
+
+        with open(os.path.join(path, MEMMAP_META_FILE)) as f:
+            meta = json.load(f)
+        self.multisequence = meta["multisequence"]
+
+        sslices = []
+        i = 0
+        for seq_len in meta["lengths"]:
+            sslices.append(slice(i, i + seq_len, 1))
+            i += seq_len
+
+        store = np.load(os.path.join(path, MEMMAP_DATA_FILE), mmap_mode="c")
+        lazy = moving_horizon or len(sslices) > 1 if lazy is None else lazy
+        self._build(torch.from_numpy(store), meta["dims"], sslices, nsteps, moving_horizon, lazy)
+
+
+def _flatten_sequences(data):
+    if isinstance(data, dict):
+        return [data]
+    return [d for x in data for d in _flatten_sequences(x)]
+
+
+def write_memmap(data, path):
+    """Convert sequence data to an on-disk store which can be opened with `MemmapSequenceDataset`.
+    Sequences are written one at a time, so at most one sequence is held in memory in addition to
+    the given data.
+
+    :param data: (str, dict str: np.array, or list) path to a file or directory readable by
+        `read_file`, or data as returned by `read_file`; nested lists of sequences (e.g. from a
+        directory of files split by experiment ID) are flattened into a multi-sequence store.
+    :param path: (str) directory to write the store to; created if it does not exist.
+    """
+    if isinstance(data, str):
+        data = read_file(data)
+    multisequence = not isinstance(data, dict)
+    data = _flatten_sequences(data)
+    assert all([_is_sequence_data(d) for d in data]), \
+        "data must be provided as a dictionary or list of dictionaries"
+
+    variables = sorted(_validate_keys(data))
+    dims = {k: data[0][k].shape[1] for k in variables}
+    sslices = _get_sequence_time_slices(data)
+
+    os.makedirs(path, exist_ok=True)
+    store = np.lib.format.open_memmap(
+        os.path.join(path, MEMMAP_DATA_FILE),
+        mode="w+",
+        dtype=np.float32,
+        shape=(sslices[-1].stop, sum(dims.values())),
+    )
+    for d, s in zip(data, sslices):
+        store[s, :] = np.concatenate([d[k] for k in variables], axis=1)
+    store.flush()
+    del store
+
+    with open(os.path.join(path, MEMMAP_META_FILE), "w") as f:
+        json.dump(
+            {
+                "dims": dims,
+                "lengths": [s.stop - s.start for s in sslices],
+                "multisequence": multisequence,
+            },
+            f,
+        )
+
+
+class StreamingSequenceDataset(IterableDataset):
+    def __init__(
+        self,
+        data,
+        nsteps=1,
+        moving_horizon=False,
+        samples_per_epoch=None,
+        name="data",
+    ):
+        """Iterable counterpart of `SequenceDataset` for unbounded streams of sequential data. Samples
+        have the same structure as those of `SequenceDataset.__getitem__`, but only a ring buffer of
+        the last 2N time steps of the stream is kept in memory.
+
+        :param data: (iterable of dict str: np.array) iterable (e.g. a generator) of dictionaries
+            mapping variable names to chunks of shape (t, Dk); chunk lengths t may vary from chunk to
+            chunk, but every chunk must contain the same variables.
+        :param nsteps: (int) N-step prediction horizon for batching data.
+        :param moving_horizon: (bool) if True, generate batches using sliding window with stride 1;
+            else use stride N.
+        :param samples_per_epoch: (int) number of samples generated per pass over the dataset. Default
+            is None, in which case samples are generated until the stream is exhausted.
+        :param name: (str) name of dataset split.
+
+        .. note:: The stream and ring buffer are shared across passes over the dataset, so each pass
+            resumes the stream where the previous one stopped.
+
+        .. warning:: A stream cannot be split across DataLoader worker processes; use `num_workers=0`.
+            Like `SequenceDataset`, this dataset requires its `collate_fn` method to be provided to
+            PyTorch's DataLoader class.
+        """
+        super().__init__()
+        self.name = name
+        self.nsteps = nsteps
+        self.moving_horizon = moving_horizon
+        self.samples_per_epoch = samples_per_epoch
+
+        self._stream = iter(data)
+        self._stride = 1 if moving_horizon else nsteps
+        self._chunk = None
+        self._row = 0
+
+        # ring buffer state: next row to write and number of time steps consumed from the stream
+        self._buffer = None
+        self._pos = 0
+        self._nseen = 0
+        self._past_offsets = torch.arange(nsteps) - nsteps - self._stride
+        self._future_offsets = torch.arange(nsteps) - nsteps
+
+        self.variables = None
+        self._vslices = None
+
+    def _init_buffer(self, chunk):
+        self.variables = list(chunk.keys())
+        i = 0
+        self._vslices = {}
+        for k in self.variables:
+            self._vslices[k] = slice(i, i + chunk[k].shape[1], 1)
+            i += chunk[k].shape[1]
+        self._buffer = torch.zeros(2 * self.nsteps, i)
+
+    def _next_chunk(self):
+        """Fetch the next chunk of the stream as a single tensor of shape (t, D)."""
+        chunk = next(self._stream)
+        if self._buffer is None:
+            self._init_buffer(chunk)
+        assert set(chunk.keys()) == set(self.variables), \
+            "chunks of streamed data must have matching keys across all chunks."
+        return torch.cat([torch.as_tensor(chunk[k], dtype=torch.float) for k in self.variables], dim=1)
+
+    def _get_sample(self):
+        size = self._buffer.shape[0]
+        past = self._buffer[(self._pos + self._past_offsets) % size]
+        future = self._buffer[(self._pos + self._future_offsets) % size]
+        return {
+            **{k + "p": past[:, self._vslices[k]] for k in self.variables},
+            **{k + "f": future[:, self._vslices[k]] for k in self.variables},
+        }
+
+    def __iter__(self):
+        """Generate N-step samples from the stream as new time steps arrive."""
+        nsamples = 0
+        while self.samples_per_epoch is None or nsamples < self.samples_per_epoch:
+            if self._chunk is None or self._row == self._chunk.shape[0]:
+                try:
+                    self._chunk = self._next_chunk()
+                except StopIteration:
+                    return
+                self._row = 0
+
+            self._buffer[self._pos] = self._chunk[self._row]
+            self._row += 1
+            self._pos = (self._pos + 1) % self._buffer.shape[0]
+            self._nseen += 1
+
+            # a sample spans one window of N steps followed by a window shifted by the stride
+            span = self.nsteps + self._stride
+            if self._nseen >= span and (self._nseen - span) % self._stride == 0:
+                nsamples += 1
+                yield self._get_sample()
+
+    def collate_fn(self, batch):
+        """Batch collation for dictionaries of samples generated by this dataset; see
+        `SequenceDataset.collate_fn`.
+
+        :param batch: (dict str: torch.Tensor) dataset sample.
+        """
+        return SequenceDataset.collate_fn(self, batch)
+
+    def __repr__(self):
+        return (
+            f"{type(self).__name__}:\n"
+            f"  variables: {self.variables}\n"
+            f"  nsteps: {self.nsteps}\n"
+            f"  moving horizon: {self.moving_horizon}\n"
+            f"  time steps consumed: {self._nseen}\n"
+        )
+
+
 class StaticDataset(Dataset):
     def __init__(
         self,
@@ -292,7 +698,6 @@ class StaticDataset(Dataset):
             provided to PyTorch's DataLoader class; see the `collate_fn` method of this class.
 
         .. todo:: Add support for categorical features.
-        .. todo:: Add support for memory-mapped and/or streaming data.
         .. todo:: Add support for data augmentation?
         .. todo:: Clean up data validation code.
         """
@@ -300,11 +705,39 @@ class StaticDataset(Dataset):
         super().__init__()
         self.name = name
 
-        self.variables = list(data.keys())
-        self.full_data = torch.cat([torch.tensor(data[k], dtype=torch.float) for k in self.variables], dim=1)
+        variables = list(data.keys())
+        full_data = torch.cat([torch.tensor(data[k], dtype=torch.float) for k in variables], dim=1)
+        self._build(full_data, {k: data[k].shape[1] for k in variables})
 
-        self.nsamples = self.full_data.shape[0]
-        self.dims = {k: (self.nsamples, *data[k].shape[1:],) for k in self.variables}
+    @classmethod
+    def from_tensor(cls, full_data, var_dims, name="data"):
+        """Create a dataset directly from a tensor of concatenated data without copying it, e.g. from
+        a view of a range of samples of a larger tensor.
+
+        :param full_data: (torch.Tensor) tensor of shape (N, D) holding all variables concatenated
+            along the feature dimension.
+        :param var_dims: (dict str: int) ordered mapping of variable names to their dimensionality.
+        :param name: (str) name of dataset split.
+        """
+        dataset = cls.__new__(cls)
+        super(StaticDataset, dataset).__init__()
+        dataset.name = name
+        dataset._build(full_data, var_dims)
+        return dataset
+
+    def _build(self, full_data, var_dims, nsamples=None):
+        """Set up slicing of data given a single tensor holding all variables.
+
+        :param full_data: (torch.Tensor) tensor of shape (N, D) holding all variables concatenated
+            along the feature dimension.
+        :param var_dims: (dict str: int) ordered mapping of variable names to their dimensionality.
+        :param nsamples: (int) number of samples; inferred from `full_data` by default.
+        """
+        self.variables = list(var_dims.keys())
+        self.full_data = full_data
+
+        self.nsamples = self.full_data.shape[0] if nsamples is None else nsamples
+        self.dims = {k: (self.nsamples, v,) for k, v in var_dims.items()}
 
         # _vslices used to slice out sequences of individual variables from full_data
         i = 0
@@ -323,12 +756,29 @@ class StaticDataset(Dataset):
         return self.nsamples
 
     def __getitem__(self, i):
-        """Fetch a single sample from the dataset."""
+        """Fetch a single sample from the dataset, or a collated batch of samples if given a
+        collection of indices (see `get_batch`)."""
+        if _is_index_batch(i):
+            return self.get_batch(i)
         return {
             k: self.full_data[i, self._vslices[k]]
             for k in self.variables
         }
 
+    def get_batch(self, idx):
+        """Fetch a batch of samples with a single indexing operation. The result is identical to
+        collating the samples `[self[i] for i in idx]` with `collate_fn`.
+
+        :param idx: (list int, np.array, or torch.Tensor) indices of the samples in the batch.
+        """
+        batch = self.full_data[torch.as_tensor(idx, dtype=torch.long)]
+        batch = {
+            k: batch[:, self._vslices[k]]
+            for k in self.variables
+        }
+        batch["name"] = self.name
+        return batch
+
     def get_full_batch(self):
         batch = {
             k: self.full_data[:, self._vslices[k]]
@@ -357,6 +807,478 @@ class StaticDataset(Dataset):
         )
 
 
+CHUNK_FILE = "chunk_{}.npy"
+
+
+def write_static_chunks(data, path, chunk_size=2 ** 20):
+    """Write static data to a chunked on-disk store which can be opened with `ChunkedStaticDataset`.
+
+    :param data: (dict str: np.array or iterable of dict str: np.array) data dictionary, or an
+        iterable (e.g. a generator) of data dictionaries holding consecutive blocks of samples, so
+        that data which does not fit in memory can be written block by block.
+    :param path: (str) directory to write the store to; created if it does not exist.
+    :param chunk_size: (int) number of samples per chunk file.
+    """
+    os.makedirs(path, exist_ok=True)
+    dims = None
+    buffer, nbuffered, nchunks, nsamples = [], 0, 0, 0
+
+    def write_chunk(rows):
+        np.save(os.path.join(path, CHUNK_FILE.format(nchunks)), rows)
+
+    for block in ([data] if isinstance(data, dict) else data):
+        if dims is None:
+            dims = {k: v.shape[1] for k, v in block.items()}
+        assert set(block.keys()) == set(dims.keys()), \
+            "blocks of static data must have matching keys across all blocks."
+        buffer.append(np.concatenate([np.asarray(block[k], dtype=np.float32) for k in dims], axis=1))
+        nbuffered += buffer[-1].shape[0]
+        nsamples += buffer[-1].shape[0]
+        if nbuffered >= chunk_size:
+            rows = np.concatenate(buffer, axis=0)
+            nfull = rows.shape[0] // chunk_size
+            for i in range(nfull):
+                write_chunk(rows[i * chunk_size:(i + 1) * chunk_size])
+                nchunks += 1
+            buffer = [rows[nfull * chunk_size:]]
+            nbuffered = buffer[0].shape[0]
+    if nbuffered > 0:
+        write_chunk(np.concatenate(buffer, axis=0))
+        nchunks += 1
+
+    with open(os.path.join(path, MEMMAP_META_FILE), "w") as f:
+        json.dump({"dims": dims, "chunk_size": chunk_size, "nchunks": nchunks, "nsamples": nsamples}, f)
+
+
+class ChunkedStaticDataset(StaticDataset):
+    def __init__(
+        self,
+        path,
+        name="data",
+        prefetch=True,
+    ):
+        """Static dataset backed by a chunked on-disk store written with `write_static_chunks`, for
+        datasets too large to hold in memory. Samples are read from memory-mapped chunk files, so
+        random access only reads the rows that are fetched. When `prefetch` is True, the first
+        access to a chunk also starts loading the next chunk into memory in a background thread;
+        use `ChunkSampler` to visit chunks in shuffled order with prefetching.
+
+        :param path: (str) directory of a store written with `write_static_chunks`.
+        :param name: (str) name of dataset split.
+        :param prefetch: (bool) whether to load the next chunk in the background.
+
+        .. warning:: `get_full_batch` reads the entire store into memory.
+        """
+        super(StaticDataset, self).__init__()
+        self.name = name
+        self.path = path
+        self.prefetch = prefetch
+
+        with open(os.path.join(path, MEMMAP_META_FILE)) as f:
+            meta = json.load(f)
+        self.chunk_size = meta["chunk_size"]
+        self.nchunks = meta["nchunks"]
+        self._build(None, meta["dims"], nsamples=meta["nsamples"])
+
+        # chunk read after each chunk, memory-mapped chunks, and (chunk index, data) of the chunk
+        # held in memory and of the chunk being prefetched
+        self._next_chunk = {c: c + 1 for c in range(self.nchunks - 1)}
+        self._mapped = {}
+        self._current = (None, None)
+        self._pending = (None, None)
+        self._executor = None
+
+    def __getstate__(self):
+        # loading state is per process, e.g. not shared with DataLoader worker processes
+        return {
+            **self.__dict__,
+            "_mapped": {},
+            "_current": (None, None),
+            "_pending": (None, None),
+            "_executor": None,
+        }
+
+    def _chunk_path(self, c):
+        return os.path.join(self.path, CHUNK_FILE.format(c))
+
+    def _load_chunk(self, c):
+        return torch.from_numpy(np.load(self._chunk_path(c)))
+
+    def set_chunk_order(self, order):
+        """Set the order in which chunks will be visited, which determines the chunk that is
+        prefetched after each chunk, and start prefetching the first chunk.
+
+        :param order: (list int) chunk indices in the order they will be visited.
+        """
+        self._next_chunk = {c: n for c, n in zip(order[:-1], order[1:])}
+        if len(order) > 0:
+            self._prefetch(order[0])
+
+    def _prefetch(self, c):
+        if not self.prefetch or c is None or c in {self._current[0], self._pending[0]}:
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        if self._pending[1] is not None:
+            self._pending[1].cancel()
+        self._pending = (c, self._executor.submit(self._load_chunk, c))
+
+    def _get_chunk(self, c):
+        """Fetch chunk c as a tensor: from memory if it has been prefetched, else memory-mapped."""
+        if c == self._current[0]:
+            return self._current[1]
+        if c == self._pending[0]:
+            self._current = (c, self._pending[1].result())
+            self._pending = (None, None)
+            self._prefetch(self._next_chunk.get(c))
+            return self._current[1]
+        if c not in self._mapped:
+            self._mapped[c] = torch.from_numpy(np.load(self._chunk_path(c), mmap_mode="c"))
+            self._prefetch(self._next_chunk.get(c))
+        return self._mapped[c]
+
+    def __getitem__(self, i):
+        """Fetch a single sample from the dataset, or a collated batch of samples if given a
+        collection of indices (see `get_batch`)."""
+        if _is_index_batch(i):
+            return self.get_batch(i)
+        c, r = divmod(i, self.chunk_size)
+        row = self._get_chunk(c)[r]
+        return {
+            k: row[self._vslices[k]]
+            for k in self.variables
+        }
+
+    def get_batch(self, idx):
+        """Fetch a batch of samples, indexing each chunk the batch draws from once.
+
+        :param idx: (list int, np.array, or torch.Tensor) indices of the samples in the batch.
+        """
+        idx = torch.as_tensor(idx, dtype=torch.long)
+        chunk_ids = idx // self.chunk_size
+        first = chunk_ids[0].item()
+        if torch.all(chunk_ids == first):
+            batch = self._get_chunk(first)[idx - first * self.chunk_size]
+        else:
+            batch = torch.empty(len(idx), self._vslices[self.variables[-1]].stop)
+            for c in torch.unique(chunk_ids).tolist():
+                mask = chunk_ids == c
+                batch[mask] = self._get_chunk(c)[idx[mask] - c * self.chunk_size]
+        batch = {
+            k: batch[:, self._vslices[k]]
+            for k in self.variables
+        }
+        batch["name"] = self.name
+        return batch
+
+    def get_full_batch(self):
+        full_data = torch.cat([self._load_chunk(c) for c in range(self.nchunks)], dim=0)
+        batch = {
+            k: full_data[:, self._vslices[k]]
+            for k in self.variables
+        }
+        batch["name"] = self.name
+        return batch
+
+
+class ChunkSampler(Sampler):
+    def __init__(self, dataset, batch_size, shuffle=True, seed=0, drop_last=False):
+        """Batch sampler for `ChunkedStaticDataset` which visits chunks one at a time and yields
+        batches of samples within each chunk, so that every batch is read from a single chunk in
+        memory while the dataset prefetches the next chunk in the background. Shuffling (of chunk
+        order and of samples within chunks) is seeded per epoch as in `WindowSampler`.
+
+        :param dataset: (ChunkedStaticDataset) dataset to sample from.
+        :param batch_size: (int) number of samples per batch.
+        :param shuffle: (bool) whether to reshuffle chunks and samples every epoch.
+        :param seed: (int) random seed; epoch i is shuffled with seed `seed + i`.
+        :param drop_last: (bool) whether to drop the last batch of each chunk if it is smaller than
+            `batch_size`.
+
+        .. note:: Prefetching happens in the process holding the dataset, so use with `num_workers=0`.
+        """
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.seed = seed
+        self.drop_last = drop_last
+        self.epoch = 0
+        self._generator = torch.Generator()
+        self._chunk_sizes = [
+            min(dataset.chunk_size, dataset.nsamples - c * dataset.chunk_size) for c in range(dataset.nchunks)
+        ]
+
+    def set_epoch(self, epoch):
+        """Set the epoch used to seed shuffling of the next pass over the dataset.
+
+        :param epoch: (int) epoch number.
+        """
+        self.epoch = epoch
+
+    def __iter__(self):
+        self._generator.manual_seed(self.seed + self.epoch)
+        self.epoch += 1
+        nchunks = self.dataset.nchunks
+        order = torch.randperm(nchunks, generator=self._generator) if self.shuffle else torch.arange(nchunks)
+        order = order.tolist()
+        self.dataset.set_chunk_order(order)
+        for c in order:
+            n = self._chunk_sizes[c]
+            idx = torch.randperm(n, generator=self._generator) if self.shuffle else torch.arange(n)
+            idx += c * self.dataset.chunk_size
+            for i in range(0, n, self.batch_size):
+                batch = idx[i:i + self.batch_size]
+                if self.drop_last and len(batch) < self.batch_size:
+                    break
+                yield batch.tolist()
+
+    def __len__(self):
+        if self.drop_last:
+            return sum(n // self.batch_size for n in self._chunk_sizes)
+        return sum((n + self.batch_size - 1) // self.batch_size for n in self._chunk_sizes)
+
+
+class SampledDataset(IterableDataset):
+    def __init__(
+        self,
+        distributions,
+        batch_size,
+        nbatches=1,
+        seed=None,
+        name="data",
+    ):
+        """Dataset which draws fresh batches of samples from declared sampling distributions on demand,
+        e.g. parameters of parametric programming problems. Batches have the same structure as those
+        produced by `StaticDataset.collate_fn`; memory use does not depend on the number of samples
+        drawn, and every pass over the dataset sees new samples.
+
+        :param distributions: (dict str: dict) dictionary mapping variable names to sampling
+            distributions, each given as a dictionary holding the distribution "type" and its
+            parameters:
+
+            + "uniform": uniform distribution over the box from "low" to "high".
+            + "normal": Gaussian distribution with "mean" and "std".
+            + "sobol": scrambled Sobol sequence over the box from "low" to "high".
+            + "lhs": Latin hypercube sample (per batch) over the box from "low" to "high".
+
+            Parameters are scalars or arrays of shape (Dk,); if all parameters of a distribution are
+            scalars, its dimensionality Dk is given by an optional "dim" entry (default 1).
+        :param batch_size: (int) number of samples per batch.
+        :param nbatches: (int) number of batches per pass over the dataset.
+        :param seed: (int) random seed; default is None, in which case a random seed is used.
+        :param name: (str) name of dataset split.
+
+        .. note:: Use with PyTorch's DataLoader class with `batch_size=None`, and `num_workers=0`
+            since worker processes would each draw the same samples.
+        """
+        super().__init__()
+        self.name = name
+        self.batch_size = batch_size
+        self.nbatches = nbatches
+
+        self._generator = torch.Generator()
+        if seed is None:
+            seed = self._generator.seed()
+        else:
+            self._generator.manual_seed(seed)
+        self.seed = seed
+
+        self.variables = list(distributions.keys())
+        self._distributions = {}
+        self._engines = {}
+        for i, (k, dist) in enumerate(distributions.items()):
+            assert dist["type"] in {"uniform", "normal", "sobol", "lhs"}, \
+                f"unsupported sampling distribution: {dist['type']}"
+            params = {
+                p: torch.as_tensor(v, dtype=torch.float).reshape(-1)
+                for p, v in dist.items() if p not in {"type", "dim"}
+            }
+            dim = max([dist.get("dim", 1)] + [len(v) for v in params.values()])
+            self._distributions[k] = (dist["type"], dim, {p: v.expand(dim) for p, v in params.items()})
+            if dist["type"] == "sobol":
+                self._engines[k] = torch.quasirandom.SobolEngine(dim, scramble=True, seed=seed + i)
+
+        self.nsamples = batch_size * nbatches
+        self.dims = {
+            **{k: (self.nsamples, v[1]) for k, v in self._distributions.items()},
+            "nsamples": self.nsamples,
+        }
+
+    def _sample(self, k, n):
+        dist, dim, params = self._distributions[k]
+        if dist == "normal":
+            return params["mean"] + params["std"] * torch.randn(n, dim, generator=self._generator)
+        elif dist == "uniform":
+            u = torch.rand(n, dim, generator=self._generator)
+        elif dist == "sobol":
+            u = self._engines[k].draw(n).float()
+        elif dist == "lhs":
+            # one sample in each of n equal-width strata of every dimension, strata paired at random
+            strata = torch.argsort(torch.rand(n, dim, generator=self._generator), dim=0)
+            u = (strata + torch.rand(n, dim, generator=self._generator)) / n
+        return params["low"] + (params["high"] - params["low"]) * u
+
+    def sample(self, n):
+        """Draw a batch of new samples.
+
+        :param n: (int) number of samples to draw.
+        """
+        batch = {k: self._sample(k, n) for k in self.variables}
+        batch["name"] = self.name
+        return batch
+
+    def __iter__(self):
+        for _ in range(self.nbatches):
+            yield self.sample(self.batch_size)
+
+    def __len__(self):
+        """Gives the number of batches per pass over the dataset."""
+        return self.nbatches
+
+    def to_static(self, nsamples, name=None):
+        """Draw a fixed set of samples as a `StaticDataset`, e.g. for development and test splits
+        which should be identical every epoch.
+
+        :param nsamples: (int) number of samples to draw.
+        :param name: (str) name of dataset split; defaults to the name of this dataset.
+        """
+        batch = self.sample(nsamples)
+        return StaticDataset.from_tensor(
+            torch.cat([batch[k] for k in self.variables], dim=1),
+            {k: v[1] for k, v in self._distributions.items()},
+            name=self.name if name is None else name,
+        )
+
+    def __repr__(self):
+        varinfo = "\n    ".join([f"{k}: {v[0]} ({v[1]})" for k, v in self._distributions.items()])
+        return (
+            f"{type(self).__name__}:\n"
+            f"  variables (distributions):\n"
+            f"    {varinfo}\n"
+            f"  batch size: {self.batch_size}\n"
+            f"  batches: {self.nbatches}\n"
+        )
+
+
+class WindowSampler(Sampler):
+    def __init__(self, dataset, batch_size, shuffle=True, seed=0, stratify=False, drop_last=False):
+        """Batch sampler which yields lists of sample indices of a `SequenceDataset` or `StaticDataset`.
+        Shuffling is seeded per epoch, so the sequence of batches is reproducible and does not depend
+        on any other use of random number generators; sample order is generated in preallocated
+        buffers, so reshuffling every epoch does not allocate per-epoch index tensors.
+
+        :param dataset: (SequenceDataset or StaticDataset) dataset to sample from.
+        :param batch_size: (int) number of samples per batch.
+        :param shuffle: (bool) whether to reshuffle samples every epoch.
+        :param seed: (int) random seed; samples of epoch i are shuffled with seed `seed + i`.
+        :param stratify: (bool) if True, every batch of a multi-sequence `SequenceDataset` draws
+            samples from each sequence in proportion to its number of samples.
+        :param drop_last: (bool) whether to drop the last batch if it is smaller than `batch_size`.
+
+        .. note:: Can be given to PyTorch's DataLoader class either as `sampler` with
+            `batch_size=None`, in which case each batch is fetched with one call to the dataset's
+            `get_batch` method (see `get_batch_dataloader`), or as `batch_sampler` together with the
+            dataset's `collate_fn`.
+        """
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.seed = seed
+        self.stratify = stratify
+        self.drop_last = drop_last
+        self.epoch = 0
+
+        self.nsamples = len(dataset)
+        self._generator = torch.Generator()
+        self._order = torch.arange(self.nsamples)
+        if stratify:
+            assert isinstance(dataset, SequenceDataset), \
+                "stratified sampling requires a SequenceDataset"
+            # sequence of each sample, given by the sequence of its first window
+            seq_starts = torch.tensor([s.start for s in dataset._sslices])
+            groups = torch.searchsorted(seq_starts, dataset._starts[:-1], right=True) - 1
+            counts = torch.bincount(groups, minlength=len(seq_starts))
+            group_starts = torch.cumsum(counts, 0) - counts
+            # samples ordered by sequence, with the position within and size of the sequence of each
+            self._groups = groups.double()
+            self._grouped = torch.sort(groups, stable=True)[1]
+            sorted_groups = groups[self._grouped]
+            self._group_pos = (torch.arange(self.nsamples) - group_starts[sorted_groups]).double()
+            self._group_counts = counts[sorted_groups].double()
+            # buffers for the random sort keys and the results of sorting them
+            self._keys = torch.empty(self.nsamples, dtype=torch.float64)
+            self._sorted_keys = torch.empty(self.nsamples, dtype=torch.float64)
+            self._shuffled = torch.empty(self.nsamples, dtype=torch.long)
+            self._perm = torch.empty(self.nsamples, dtype=torch.long)
+
+    def set_epoch(self, epoch):
+        """Set the epoch used to seed shuffling of the next pass over the dataset.
+
+        :param epoch: (int) epoch number.
+        """
+        self.epoch = epoch
+
+    def _sample_order(self):
+        self._generator.manual_seed(self.seed + self.epoch)
+        if not self.stratify:
+            if self.shuffle:
+                torch.randperm(self.nsamples, generator=self._generator, out=self._order)
+            return self._order
+
+        grouped = self._grouped
+        if self.shuffle:
+            # shuffle samples within each sequence by sorting on the sequence index plus a random offset
+            torch.rand(self.nsamples, generator=self._generator, out=self._keys)
+            torch.sort(self._keys.add_(self._groups), out=(self._sorted_keys, self._shuffled))
+            grouped = self._shuffled
+            torch.rand(self.nsamples, generator=self._generator, out=self._keys)
+        else:
+            self._keys.fill_(0.5)
+        # interleave sequences by sorting on each sample's relative position within its sequence
+        self._keys.add_(self._group_pos).div_(self._group_counts)
+        torch.sort(self._keys, out=(self._sorted_keys, self._perm))
+        return torch.index_select(grouped, 0, self._perm, out=self._order)
+
+    def __iter__(self):
+        order = self._sample_order()
+        self.epoch += 1
+        for i in range(0, self.nsamples, self.batch_size):
+            batch = order[i:i + self.batch_size]
+            if self.drop_last and len(batch) < self.batch_size:
+                break
+            yield batch.tolist()
+
+    def __len__(self):
+        if self.drop_last:
+            return self.nsamples // self.batch_size
+        return (self.nsamples + self.batch_size - 1) // self.batch_size
+
+
+def get_batch_dataloader(
+    dataset, batch_size, shuffle=False, drop_last=False, seed=0, stratify=False, **kwargs,
+):
+    """Create a DataLoader which fetches each batch from a dataset with one call to its `get_batch`
+    method, instead of fetching samples one at a time and collating them. Batches have the same
+    structure as those produced by the dataset's `collate_fn`.
+
+    :param dataset: (SequenceDataset or StaticDataset) dataset to load batches from.
+    :param batch_size: (int) number of samples per batch.
+    :param shuffle: (bool) whether to reshuffle samples every epoch.
+    :param drop_last: (bool) whether to drop the last batch if it is smaller than `batch_size`.
+    :param seed: (int) random seed for shuffling; see `WindowSampler`.
+    :param stratify: (bool) whether to draw samples from each sequence of a multi-sequence dataset
+        in proportion to its size in every batch; see `WindowSampler`.
+    :param kwargs: additional keyword arguments passed to PyTorch's DataLoader class.
+    """
+    return DataLoader(
+        dataset,
+        sampler=WindowSampler(
+            dataset, batch_size, shuffle=shuffle, seed=seed, stratify=stratify, drop_last=drop_last,
+        ),
+        batch_size=None,
+        **kwargs,
+    )
+
+
 def normalize_data(data, norm_type, stats=None):
     """Normalize data, optionally using arbitrary statistics (e.g. computed from train split).
 
@@ -372,13 +1294,16 @@ def normalize_data(data, norm_type, stats=None):
     if not multisequence:
         data = [data]
 
-    if stats is None:
-        norm_fn = lambda x, _: norm_fns[norm_type](x)
-    else:
-        norm_fn = lambda x, k: norm_fns[norm_type](
+    def norm_fn(x, k):
+        # x is a concatenated copy of the data, so it is normalized in place when possible
+        out = x if np.issubdtype(x.dtype, np.floating) else None
+        if stats is None:
+            return norm_fns[norm_type](x, out=out)
+        return norm_fns[norm_type](
             x,
             stats[k + "_min"].reshape(1, -1),
             stats[k + "_max"].reshape(1, -1),
+            out=out,
         )
 
     keys = data[0].keys()
@@ -397,6 +1322,115 @@ def normalize_data(data, norm_type, stats=None):
     return data if multisequence else data[0], stats
 
 
+class NormStats:
+    """
+    Accumulates normalization statistics of each variable chunk by chunk, so that statistics of data
+    too large to hold in memory (e.g. many files, or a generator) can be computed in a single pass.
+    Means and variances are merged with the parallel form of Welford's algorithm; minima and maxima
+    are running extrema.
+    """
+    def __init__(self):
+        self.count = {}
+        self.mean = {}
+        self.m2 = {}
+        self.min = {}
+        self.max = {}
+
+    def update(self, data):
+        """Add a chunk of data to the statistics.
+
+        :param data: (dict str: np.array or list) data dictionary mapping variable names to arrays of
+            shape (t, Dk), or a (possibly nested) list of data dictionaries as returned by `read_file`.
+        """
+        for d in _flatten_sequences(data):
+            for k, v in d.items():
+                v = np.asarray(v, dtype=np.float64)
+                n = v.shape[0]
+                if n == 0:
+                    continue
+                mean = v.mean(axis=0)
+                m2 = ((v - mean) ** 2).sum(axis=0)
+                if k not in self.count:
+                    self.count[k], self.mean[k], self.m2[k] = n, mean, m2
+                    self.min[k], self.max[k] = v.min(axis=0), v.max(axis=0)
+                    continue
+                total = self.count[k] + n
+                delta = mean - self.mean[k]
+                self.mean[k] = self.mean[k] + delta * n / total
+                self.m2[k] = self.m2[k] + m2 + delta ** 2 * self.count[k] * n / total
+                self.count[k] = total
+                self.min[k] = np.minimum(self.min[k], v.min(axis=0))
+                self.max[k] = np.maximum(self.max[k], v.max(axis=0))
+        return self
+
+    def get_stats(self, norm_type):
+        """Statistics in the format returned by `normalize_data`, which can be passed to
+        `normalize_data` or `normalize_batch`.
+
+        :param norm_type: (str) type of normalization; can be "zero-one", "one-one", or "zscore".
+        """
+        if norm_type == "zscore":
+            stat0 = self.mean
+            stat1 = {k: np.sqrt(v / self.count[k]) for k, v in self.m2.items()}
+        else:
+            stat0, stat1 = self.min, self.max
+        return {
+            **{k + "_min": v for k, v in stat0.items()},
+            **{k + "_max": v for k, v in stat1.items()},
+        }
+
+    def save(self, path):
+        """Save accumulated statistics to an .npz file.
+
+        :param path: (str) path of file to write.
+        """
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                **{f"count/{k}": v for k, v in self.count.items()},
+                **{f"mean/{k}": v for k, v in self.mean.items()},
+                **{f"m2/{k}": v for k, v in self.m2.items()},
+                **{f"min/{k}": v for k, v in self.min.items()},
+                **{f"max/{k}": v for k, v in self.max.items()},
+            )
+
+    @classmethod
+    def load(cls, path):
+        """Load statistics saved with `save`; loaded statistics can be updated with further data.
+
+        :param path: (str) path of file to read.
+        """
+        stats = cls()
+        with np.load(path) as f:
+            for key in f.files:
+                name, k = key.split("/", 1)
+                getattr(stats, name)[k] = int(f[key]) if name == "count" else f[key]
+        return stats
+
+
+def normalize_batch(batch, norm_type, stats):
+    """Normalize the variables of a batch fetched from a dataset, e.g. within a collate function, so
+    that datasets can hold raw data and normalization is applied only at batch-fetch time. Keys of
+    N-step sequence batches (e.g. "Yp" and "Yf") use the statistics of their variable (e.g. "Y");
+    entries without statistics are passed through unchanged.
+
+    :param batch: (dict str: torch.Tensor) batch dictionary.
+    :param norm_type: (str) type of normalization; can be "zero-one", "one-one", or "zscore".
+    :param stats: (dict str: np.array) statistics as returned by `normalize_data` or
+        `NormStats.get_stats`.
+    """
+    norm_batch = {}
+    for k, v in batch.items():
+        var = k if k + "_min" in stats else k[:-1]
+        if not isinstance(v, torch.Tensor) or var + "_min" not in stats:
+            norm_batch[k] = v
+            continue
+        stat0 = torch.as_tensor(stats[var + "_min"], dtype=v.dtype, device=v.device)
+        stat1 = torch.as_tensor(stats[var + "_max"], dtype=v.dtype, device=v.device)
+        norm_batch[k] = torch.nan_to_num(batch_norm_fns[norm_type](v, stat0, stat1))
+    return norm_batch
+
+
 def split_sequence_data(data, nsteps, moving_horizon=False, split_ratio=None):
     """Split a data dictionary into train, development, and test sets. Splits data into thirds by
     default, but arbitrary split ratios for train and development can be provided.
@@ -413,19 +1447,9 @@ def split_sequence_data(data, nsteps, moving_horizon=False, split_ratio=None):
         "data must be provided as a dictionary or list of dictionaries"
 
     nsim = len(data) if multisequence else min(v.shape[0] for v in data.values())
-    split_mod = nsteps if not multisequence else 1
-    if split_ratio is None:
-        split_len = nsim // 3
-        split_len -= split_len % split_mod
-        train_slice = slice(0, split_len + nsteps * (not multisequence))
-        dev_slice = slice(split_len, split_len * 2 + nsteps * (not multisequence))
-        test_slice = slice(split_len * 2, nsim)
-    else:
-        dev_start = math.ceil(split_ratio[0] * nsim / 100.)
-        test_start = dev_start + math.ceil(split_ratio[1] * nsim / 100.)
-        train_slice = slice(0, dev_start)
-        dev_slice = slice(dev_start, test_start)
-        test_slice = slice(test_start, nsim)
+    train_slice, dev_slice, test_slice = _get_split_slices(
+        nsim, split_ratio, nsteps=None if multisequence else nsteps,
+    )
 
     if not multisequence:
         train_data = {k: v[train_slice] for k, v in data.items()}
@@ -449,10 +1473,33 @@ def split_static_data(data, split_ratio=None):
     """
 
     nsim = min(v.shape[0] for v in data.values())
+    train_slice, dev_slice, test_slice = _get_split_slices(nsim, split_ratio)
+
+    train_data = {k: v[train_slice] for k, v in data.items()}
+    dev_data = {k: v[dev_slice] for k, v in data.items()}
+    test_data = {k: v[test_slice] for k, v in data.items()}
+
+    return train_data, dev_data, test_data
+
+
+def _get_split_slices(nsim, split_ratio=None, nsteps=None):
+    """Compute slices of train, development, and test splits over `nsim` time steps, sequences, or
+    samples; see `split_sequence_data` and `split_static_data`.
+
+    :param nsim: (int) number of time steps, sequences, or samples to split.
+    :param split_ratio: (list float) percentage of data in train and development splits.
+    :param nsteps: (int) N-step prediction horizon when splitting time steps of a single sequence;
+        the default split then rounds split lengths down to multiples of N and extends the train
+        and development splits by N steps.
+    """
     if split_ratio is None:
         split_len = nsim // 3
-        train_slice = slice(0, split_len)
-        dev_slice = slice(split_len, split_len * 2)
+        overlap = 0
+        if nsteps is not None:
+            split_len -= split_len % nsteps
+            overlap = nsteps
+        train_slice = slice(0, split_len + overlap)
+        dev_slice = slice(split_len, split_len * 2 + overlap)
         test_slice = slice(split_len * 2, nsim)
     else:
         dev_start = math.ceil(split_ratio[0] * nsim / 100.)
@@ -460,51 +1507,144 @@ def split_static_data(data, split_ratio=None):
         train_slice = slice(0, dev_start)
         dev_slice = slice(dev_start, test_start)
         test_slice = slice(test_start, nsim)
+    return train_slice, dev_slice, test_slice
+
+
+def get_sequence_datasets(data, nsteps, moving_horizon=False, split_ratio=None, lazy=None):
+    """Create train, development, and test `SequenceDataset`s split as by `split_sequence_data`.
+    Data is copied into a single tensor once and each split is a view of a range of time steps of
+    that tensor, rather than a copy of its own.
+
+    :param data: (dict str: np.array or list[dict str: np.array]) data dictionary or list of data
+        dictionaries; if latter is provided, splits are computed over the number of sequences.
+    :param nsteps: (int) N-step prediction horizon for batching data.
+    :param moving_horizon: (bool) if True, generate batches using sliding window with stride 1;
+        else use stride N.
+    :param split_ratio: (list float) percentage of data in train and development splits; see
+        `split_sequence_data`.
+    :param lazy: (bool) if True, gather N-step windows when fetched. Default is None, in which case
+        windows are gathered lazily for moving horizon batching and for multi-sequence data, the
+        cases in which batched windows would otherwise be copies of the data.
+    """
+    multisequence = _is_multisequence_data(data)
+    assert _is_sequence_data(data) or multisequence, \
+        "data must be provided as a dictionary or list of dictionaries"
+    lazy = moving_horizon or multisequence if lazy is None else lazy
 
-    train_data = {k: v[train_slice] for k, v in data.items()}
-    dev_data = {k: v[dev_slice] for k, v in data.items()}
-    test_data = {k: v[test_slice] for k, v in data.items()}
+    sequences = data if multisequence else [data]
+    variables = list(_validate_keys(sequences))
+    full_data = torch.cat(
+        [torch.cat([torch.tensor(d[k], dtype=torch.float) for k in variables], dim=1) for d in sequences],
+        dim=0,
+    )
+    var_dims = {k: sequences[0][k].shape[1] for k in variables}
+    sslices = _get_sequence_time_slices(sequences)
+
+    nsim = len(sequences) if multisequence else full_data.shape[0]
+    datasets = []
+    for split, name in zip(
+        _get_split_slices(nsim, split_ratio, nsteps=None if multisequence else nsteps),
+        ["train", "dev", "test"],
+    ):
+        if multisequence:
+            split_sslices = sslices[split]
+            start, stop = split_sslices[0].start, split_sslices[-1].stop
+            split_sslices = [slice(s.start - start, s.stop - start, 1) for s in split_sslices]
+        else:
+            start, stop = split.start, min(split.stop, nsim)
+            split_sslices = [slice(0, stop - start, 1)]
+        datasets.append(SequenceDataset.from_tensor(
+            full_data[start:stop],
+            var_dims,
+            split_sslices,
+            nsteps=nsteps,
+            moving_horizon=moving_horizon,
+            name=name,
+            multisequence=multisequence,
+            lazy=lazy,
+        ))
+    return datasets
+
+
+def get_static_datasets(data, split_ratio=None):
+    """Create train, development, and test `StaticDataset`s split as by `split_static_data`. Data is
+    copied into a single tensor once and each split is a view of a range of samples of that tensor,
+    rather than a copy of its own.
+
+    :param data: (dict str: np.array) data dictionary.
+    :param split_ratio: (list float) percentage of data in train and development splits; see
+        `split_static_data`.
+    """
+    variables = list(data.keys())
+    full_data = torch.cat([torch.tensor(data[k], dtype=torch.float) for k in variables], dim=1)
+    var_dims = {k: data[k].shape[1] for k in variables}
+    return [
+        StaticDataset.from_tensor(full_data[split], var_dims, name=name)
+        for split, name in zip(_get_split_slices(full_data.shape[0], split_ratio), ["train", "dev", "test"])
+    ]
 
-    return train_data, dev_data, test_data
 
+def _norm_out(M, out=None):
+    """Array to write normalized data to: `out` if given, else a new array with the floating point
+    dtype of M (float64 for non-floating point data)."""
+    if out is None:
+        out = np.empty(M.shape, dtype=M.dtype if np.issubdtype(M.dtype, np.floating) else np.float64)
+    return out
 
-def standardize(M, mean=None, std=None):
+
+def standardize(M, mean=None, std=None, out=None):
+    """
+    :param M: (2-d np.array) Data to be normalized
+    :param mean: (np.array) Optional mean. If not provided is inferred from data.
+    :param std: (np.array) Optional standard deviation. If not provided is inferred from data.
+    :param out: (2-d np.array) Optional array to write normalized data to; can be M itself to normalize in place.
+    :return: (2-d np.array) Standardized data with the floating point dtype of M
+    """
     mean = M.mean(axis=0).reshape(1, -1) if mean is None else mean
     std = M.std(axis=0).reshape(1, -1) if std is None else std
+    out = _norm_out(M, out)
     with warnings.catch_warnings():
         warnings.simplefilter("ignore")
-        M_norm = (M - mean) / std
-    return np.nan_to_num(M_norm), mean.squeeze(0), std.squeeze(0)
+        np.subtract(M, np.asarray(mean, dtype=out.dtype), out=out)
+        np.divide(out, np.asarray(std, dtype=out.dtype), out=out)
+    return np.nan_to_num(out, copy=False), mean.squeeze(0), std.squeeze(0)
 
 
-def normalize_01(M, Mmin=None, Mmax=None):
+def normalize_01(M, Mmin=None, Mmax=None, out=None):
     """
     :param M: (2-d np.array) Data to be normalized
     :param Mmin: (int) Optional minimum. If not provided is inferred from data.
     :param Mmax: (int) Optional maximum. If not provided is inferred from data.
-    :return: (2-d np.array) Min-max normalized data
+    :param out: (2-d np.array) Optional array to write normalized data to; can be M itself to normalize in place.
+    :return: (2-d np.array) Min-max normalized data with the floating point dtype of M
     """
     Mmin = M.min(axis=0).reshape(1, -1) if Mmin is None else Mmin
     Mmax = M.max(axis=0).reshape(1, -1) if Mmax is None else Mmax
+    out = _norm_out(M, out)
     with warnings.catch_warnings():
         warnings.simplefilter("ignore")
-        M_norm = (M - Mmin) / (Mmax - Mmin)
-    return np.nan_to_num(M_norm), Mmin.squeeze(0), Mmax.squeeze(0)
+        np.subtract(M, np.asarray(Mmin, dtype=out.dtype), out=out)
+        np.divide(out, np.asarray(Mmax - Mmin, dtype=out.dtype), out=out)
+    return np.nan_to_num(out, copy=False), Mmin.squeeze(0), Mmax.squeeze(0)
 
 
-def normalize_11(M, Mmin=None, Mmax=None):
+def normalize_11(M, Mmin=None, Mmax=None, out=None):
     """
     :param M: (2-d np.array) Data to be normalized
     :param Mmin: (int) Optional minimum. If not provided is inferred from data.
     :param Mmax: (int) Optional maximum. If not provided is inferred from data.
-    :return: (2-d np.array) Min-max normalized data
+    :param out: (2-d np.array) Optional array to write normalized data to; can be M itself to normalize in place.
+    :return: (2-d np.array) Min-max normalized data with the floating point dtype of M
     """
     Mmin = M.min(axis=0).reshape(1, -1) if Mmin is None else Mmin
     Mmax = M.max(axis=0).reshape(1, -1) if Mmax is None else Mmax
+    out = _norm_out(M, out)
     with warnings.catch_warnings():
         warnings.simplefilter("ignore")
-        M_norm = 2 * ((M - Mmin) / (Mmax - Mmin)) - 1
-    return np.nan_to_num(M_norm), Mmin.squeeze(0), Mmax.squeeze(0)
+        np.subtract(M, np.asarray(Mmin, dtype=out.dtype), out=out)
+        np.divide(out, np.asarray((Mmax - Mmin) / 2, dtype=out.dtype), out=out)
+        np.subtract(out, 1, out=out)
+    return np.nan_to_num(out, copy=False), Mmin.squeeze(0), Mmax.squeeze(0)
 
 
 def denormalize_01(M, Mmin, Mmax):
@@ -541,6 +1681,12 @@ norm_fns = {
     "one-one": normalize_11,
 }
 
+batch_norm_fns = {
+    "zscore": lambda M, mean, std: (M - mean) / std,
+    "zero-one": lambda M, Mmin, Mmax: (M - Mmin) / (Mmax - Mmin),
+    "one-one": lambda M, Mmin, Mmax: 2 * ((M - Mmin) / (Mmax - Mmin)) - 1,
+}
+
 denorm_fns = {
     "zscore": destandardize,
     "zero-one": denormalize_01,
@@ -0,0 +1,169 @@
+"""
+Data-parallel training of a Problem over multiple processes, e.g. the cores of CPU-only cluster nodes, which
+a single PyTorch process does not saturate for small models. Each process trains a replica of the model on its
+own shard of the training data, gradients are averaged with DistributedDataParallel, and metrics are averaged
+over processes. Logging and checkpointing happen only in the process of rank 0.
+
+Processes on a single node can be started with launch; multi-node jobs initialize the default process
+group themselves (e.g. via torchrun) before constructing a DistributedTrainer.
+"""
+import os
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import BatchSampler, DataLoader, DistributedSampler
+
+from neuromancer.trainer import Trainer
+
+
+def get_distributed_dataloader(
+    dataset, batch_size, shuffle=False, drop_last=False, seed=0, num_replicas=None, rank=None, **kwargs,
+):
+    """Create a DataLoader over the shard of a dataset belonging to one process of a distributed job.
+    Like `get_batch_dataloader`, each batch is fetched with one call to the dataset's `get_batch` method.
+
+    :param dataset: (SequenceDataset or StaticDataset) dataset to load batches from.
+    :param batch_size: (int) number of samples per batch in each process.
+    :param shuffle: (bool) whether to reshuffle samples every epoch; the shuffle is shared by all processes.
+    :param drop_last: (bool) whether to drop samples so that every process gets the same number of samples,
+        instead of padding the shards with repeated samples, and to drop the last batch if it is smaller than
+        `batch_size`.
+    :param seed: (int) random seed for shuffling; samples of epoch i are shuffled with seed `seed + i`.
+    :param num_replicas: (int) number of processes; defaults to the world size of the default process group.
+    :param rank: (int) rank of this process; defaults to its rank in the default process group.
+    :param kwargs: additional keyword arguments passed to PyTorch's DataLoader class.
+    """
+    sampler = DistributedSampler(
+        dataset, num_replicas=num_replicas, rank=rank, shuffle=shuffle, seed=seed, drop_last=drop_last,
+    )
+    return DataLoader(
+        dataset,
+        sampler=BatchSampler(sampler, batch_size, drop_last),
+        batch_size=None,
+        **kwargs,
+    )
+
+
+class _NullLogger:
+    """
+    Logger for processes other than rank 0, which discards everything.
+    """
+    def log_parameters(self):
+        pass
+
+    def log_weights(self, model):
+        return sum([i.numel() for i in list(model.parameters()) if i.requires_grad])
+
+    def log_metrics(self, output, step=None):
+        pass
+
+    def log_artifacts(self, artifacts):
+        pass
+
+    def clean_up(self):
+        pass
+
+
+class DistributedTrainer(Trainer):
+    """
+    Trainer for one process of a data-parallel job. The default process group must be initialized, e.g. by launch.
+    Training data should be sharded between processes, e.g. with get_distributed_dataloader. Samplers with
+    a set_epoch method are reseeded every epoch so that all processes shuffle consistently.
+    """
+    def __init__(
+        self,
+        problem,
+        train_data,
+        dev_data,
+        test_data,
+        optimizer,
+        logger=None,
+        find_unused_parameters=False,
+        **kwargs,
+    ):
+        """
+
+        :param problem: (nm.problem.Problem) Object which defines multi-objective loss function and computational graph.
+                                            Must be constructed identically (e.g. with the same seed) in every process.
+        :param train_data: (torch DataLoader) Loader of this process's shard of the training data
+        :param dev_data: (torch DataLoader) Loader of the development data, either sharded or complete
+        :param test_data: (torch DataLoader) Loader of the test data, either sharded or complete
+        :param optimizer: (torch Optimizer)
+        :param logger: (nm.Logger) Logger used by the process of rank 0. Other processes do not log.
+        :param find_unused_parameters: (bool) Passed to DistributedDataParallel; needed if some parameters of the problem
+                                              do not contribute to the training loss.
+        :param kwargs: Additional keyword arguments of Trainer
+        """
+        self.rank = dist.get_rank()
+        self.world_size = dist.get_world_size()
+        if self.rank != 0:
+            logger = _NullLogger()
+        super().__init__(problem, train_data, dev_data, test_data, optimizer, logger=logger, **kwargs)
+        self._train_model = DistributedDataParallel(problem, find_unused_parameters=find_unused_parameters)
+
+    def _sync_metrics(self, output):
+        """
+        Average all scalar floating point metrics over processes with a single all-reduce.
+        """
+        keys = sorted(k for k, v in output.items()
+                      if isinstance(v, torch.Tensor) and v.dim() == 0 and v.is_floating_point())
+        if not keys:
+            return output
+        values = torch.stack([output[k].detach().to("cpu", torch.float64) for k in keys])
+        dist.all_reduce(values)
+        values /= self.world_size
+        output = dict(output)
+        for k, v in zip(keys, values):
+            output[k] = v.to(output[k].device, output[k].dtype)
+        return output
+
+    def _should_eval(self, epoch):
+        """
+        Evaluate when the process of rank 0 decides to, since wall-clock eval budgets differ between processes.
+        """
+        decision = torch.tensor([float(super()._should_eval(epoch))])
+        dist.broadcast(decision, 0)
+        return bool(decision.item())
+
+    def checkpoint(self, epoch):
+        """
+        Write a checkpoint from the process of rank 0 only. Every process can resume from it.
+        """
+        if self.rank == 0:
+            super().checkpoint(epoch)
+
+
+def _run(rank, fn, world_size, backend, master_addr, master_port, num_threads, args):
+    os.environ.setdefault("MASTER_ADDR", master_addr)
+    os.environ.setdefault("MASTER_PORT", str(master_port))
+    # split the node's cores between processes instead of every process using all of them
+    torch.set_num_threads(num_threads or max(1, (os.cpu_count() or 1) // world_size))
+    dist.init_process_group(backend, rank=rank, world_size=world_size)
+    try:
+        fn(rank, world_size, *args)
+    finally:
+        dist.destroy_process_group()
+
+
+def launch(fn, nprocs, *args, backend="gloo", master_addr="127.0.0.1", master_port=29500, num_threads=None):
+    """
+    Run fn(rank, world_size, *args) in nprocs processes on this node, each with the default process group initialized.
+    fn typically builds the datasets, problem, optimizer and DistributedTrainer, and trains.
+
+    :param fn: (callable) Picklable (module level) function to run in every process
+    :param nprocs: (int) Number of processes
+    :param args: Additional arguments of fn
+    :param backend: (str) torch.distributed backend; gloo supports CPU tensors
+    :param master_addr: (str) Address of the process of rank 0
+    :param master_port: (int) Free port on master_addr
+    :param num_threads: (int) Number of intra-op threads per process. By default the cores of the node are
+                              divided evenly between processes.
+    """
+    mp.spawn(
+        _run,
+        args=(fn, nprocs, backend, master_addr, master_port, num_threads, args),
+        nprocs=nprocs,
+        join=True,
+    )
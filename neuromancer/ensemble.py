@@ -0,0 +1,163 @@
+"""
+Ensembles of identically structured models (e.g. Problems differing only in the seed of their weight initialization)
+which are evaluated and trained together in one vectorized forward and backward pass.
+"""
+from collections import OrderedDict
+from copy import deepcopy
+
+import torch
+import torch.nn as nn
+from torch.func import functional_call, stack_module_state, vmap
+
+from neuromancer.callbacks import Callback
+from neuromancer.trainer import _clone_state_dict, _copy_state_dict_
+
+
+class Ensemble(nn.Module):
+    """
+    Stacks the parameters and buffers of K models with the same structure along a new leading dimension and evaluates
+    all members with torch.func.vmap, so that small models train K times faster than in K separate runs. The ensemble
+    can be trained in place of a Problem by a Trainer with an EnsembleCallback.
+
+    For every tensor output key k of the members (other than inputs passed through), the output dictionary holds:
+
+        + k_members: stacked member outputs of shape (K, ...)
+        + k: sum over members for scalar outputs such as losses, so that each member receives the gradient of its own
+          loss, and mean over members otherwise
+        + k_mean and k_std: mean and standard deviation over members of non-scalar outputs, e.g. for
+          VisualizerUncertaintyOpen
+
+    Member state must be held entirely in parameters and buffers, and members must not modify tensors in place.
+    """
+    def __init__(self, models):
+        """
+
+        :param models: (list of nn.Module) At least two models with identical structure, e.g. Problems
+        """
+        super().__init__()
+        assert len(models) > 1, "An ensemble needs at least two members"
+        params, buffers = stack_module_state(models)
+        self.param_names = list(params)
+        self.buffer_names = list(buffers)
+        self.params = nn.ParameterList([nn.Parameter(params[k]) for k in self.param_names])
+        for i, k in enumerate(self.buffer_names):
+            self.register_buffer(f"buffer_{i}", buffers[k])
+        # stateless copy of the member structure, not registered as a submodule so its (meta) parameters are not trained
+        object.__setattr__(self, "_base", deepcopy(models[0]).to("meta"))
+        self.nmembers = len(models)
+        self.grad_inference = getattr(models[0], "grad_inference", False)
+
+    def train(self, mode=True):
+        super().train(mode)
+        self._base.train(mode)
+        return self
+
+    def _states(self):
+        params = dict(zip(self.param_names, self.params))
+        buffers = {k: getattr(self, f"buffer_{i}") for i, k in enumerate(self.buffer_names)}
+        return params, buffers
+
+    def member_state_dict(self, i):
+        """
+        :param i: (int) Index of a member
+        :return: (dict {str: Tensor}) State dict of member i, which can be loaded by the models the ensemble was built from
+        """
+        params, buffers = self._states()
+        return OrderedDict((k, v[i].detach()) for k, v in {**params, **buffers}.items())
+
+    def forward(self, data):
+        passthrough = {}
+        input_ids = {id(v) for v in data.values()}
+
+        def member_forward(params, buffers):
+            # copy since e.g. Variables add their values to the data dictionary
+            output = functional_call(self._base, (params, buffers), (dict(data),))
+            batched = {}
+            for k, v in output.items():
+                if isinstance(v, torch.Tensor) and id(v) not in input_ids:
+                    batched[k] = v
+                else:
+                    passthrough[k] = v
+            return batched
+
+        outputs = vmap(member_forward, randomness="different")(*self._states())
+        ensemble_output = {}
+        for k, v in outputs.items():
+            ensemble_output[f"{k}_members"] = v
+            if v.dim() == 1:
+                ensemble_output[k] = v.sum()
+            else:
+                ensemble_output[k] = ensemble_output[f"{k}_mean"] = v.mean(0)
+                ensemble_output[f"{k}_std"] = v.std(0)
+        return {**passthrough, **ensemble_output}
+
+
+class EnsembleCallback(Callback):
+    """
+    Callback for training an Ensemble with a Trainer, which tracks the best weights and early stopping of each member
+    separately according to its own eval metric. Training stops once every member has run out of patience;
+    the best model returned by the Trainer holds the best weights of each member. Stopped members keep training
+    until then but their best weights are kept. Training behavior is otherwise given by the wrapped callback.
+    """
+    def __init__(self, callback=Callback(), patience=None, warmup=None):
+        """
+
+        :param callback: (nm.Callback) Callback of the training job
+        :param patience: (int) Number of epochs to allow no improvement of a member; defaults to the Trainer's patience
+        :param warmup: (int) How many epochs to wait before enacting early stopping; defaults to the Trainer's warmup
+        """
+        super().__init__()
+        self.callback = callback
+        self.patience, self.warmup = patience, warmup
+
+    def begin_train(self, trainer):
+        self.callback.begin_train(trainer)
+        nmembers = trainer.model.nmembers
+        self._patience = trainer.patience if self.patience is None else self.patience
+        self._warmup = trainer.warmup if self.warmup is None else self.warmup
+        worst = float("inf") if trainer._eval_min else -float("inf")
+        self.best = torch.full((nmembers,), worst, dtype=torch.float64)
+        self.badcount = torch.zeros(nmembers, dtype=torch.long)
+        self.best_state = _clone_state_dict(trainer.best_model)
+        self._last_eval = trainer.start_epoch - 1
+
+    def begin_epoch(self, trainer, output):
+        self.callback.begin_epoch(trainer, output)
+
+    def begin_eval(self, trainer, output):
+        self.callback.begin_eval(trainer, output)
+
+    def end_batch(self, trainer, output):
+        self.callback.end_batch(trainer, output)
+
+    def end_eval(self, trainer, output):
+        self.callback.end_eval(trainer, output)
+        metric = output[f"{trainer.eval_metric}_members"].detach().to("cpu", torch.float64)
+        improved = metric < self.best if trainer._eval_min else metric > self.best
+        self.best = torch.where(improved, metric, self.best)
+        epoch = trainer.current_epoch
+        self.badcount += max(0, epoch - max(self._last_eval, self._warmup))
+        self.badcount[improved] = 0
+        self._last_eval = epoch
+
+        if improved.any():
+            state = trainer.model.state_dict()
+            for k, v in self.best_state.items():
+                mask = improved.to(v.device)
+                v[mask] = state[k].detach()[mask]
+        # replace the Trainer's selection by the summed eval metric with the per member selection
+        _copy_state_dict_(trainer.best_model, self.best_state)
+        trainer.best_devloss = self.best.sum().item()
+        trainer.badcount = trainer.patience + 1 if (self.badcount > self._patience).all() else 0
+
+    def end_epoch(self, trainer, output):
+        self.callback.end_epoch(trainer, output)
+
+    def end_train(self, trainer, output):
+        self.callback.end_train(trainer, output)
+
+    def begin_test(self, trainer):
+        self.callback.begin_test(trainer)
+
+    def end_test(self, trainer, output):
+        self.callback.end_test(trainer, output)
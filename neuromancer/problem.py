@@ -8,14 +8,44 @@ from typing import Dict, List, Callable
 import torch
 import torch.nn as nn
 
-from neuromancer.constraint import Variable, Loss
+from neuromancer.constraint import Variable, Loss, Objective, Constraint
+
+
+def _variable_keys(var):
+    """
+    :param var: (Variable)
+    :return: (set of str) Keys of the data dictionary read when evaluating the Variable
+    """
+    if var.value is not None:
+        return set()
+    if var.op is None:
+        return {var.key if var.slice is None else var.key[:-len(str(var.slice))-1]}
+    keys = set()
+    for child in [var.left, var.right]:
+        if child is not None:
+            keys |= _variable_keys(child)
+    return keys
+
+
+def _loss_keys(term):
+    """
+    :param term: (Loss, Objective or Constraint)
+    :return: (set of str or None) Keys of the data dictionary read when evaluating the term, or None if unknown
+    """
+    if isinstance(term, Loss):
+        return set(term.variable_names)
+    if isinstance(term, Objective):
+        return _variable_keys(term.var)
+    if isinstance(term, Constraint):
+        return _variable_keys(term.left) | _variable_keys(term.right)
+    return None
 
 
 class Problem(nn.Module):
 
     def __init__(self, objectives: List[Loss], constraints: List[Loss],
                  components: List[Callable[[Dict[str, torch.Tensor]], Dict[str, torch.Tensor]]],
-                 grad_inference=False):
+                 grad_inference=False, outputs=None):
         """
         This is similar in spirit to a nn.Sequential module. However,
         by concatenating input and output dictionaries for each component
@@ -23,10 +53,15 @@ class Problem(nn.Module):
         In addition the Problem module takes care of calculating weighted multi-objective
         loss functions via the lists of Loss objects (constraints and objectives) which calculate loss terms
         from aggregated input and set of outputs from the component modules.
+        Outputs are checked for name collisions only the first time the problem is called with a given set of input keys.
 
         :param objectives: list of objects which implement the Loss interface (e.g. Objective, Loss, or Constraint)
         :param constraints: list of objects which implement the Loss interface (e.g. Objective, Loss, or Constraint)
         :param components: list of objects which implement the component interface (e.g. Function, Policy, Estimator)
+        :param grad_inference: (bool) Whether gradients are enabled during evaluation, e.g. for losses involving gradients
+        :param outputs: (list of str or dict {str: list of str}) Keys besides losses to return from forward, either for all
+                        data or for each data name (e.g. {'nstep_train': [], 'loop_dev': ['Y_pred_dynamics']}). Only
+                        components on which returned keys depend are evaluated. Default None returns all keys.
         """
         super().__init__()
         self.objectives = nn.ModuleList(objectives)
@@ -34,6 +69,9 @@ class Problem(nn.Module):
         self.components = nn.ModuleList(components)
         self._check_unique_names()
         self.grad_inference = grad_inference
+        self.outputs = outputs
+        # execution plans compiled on first call for each set of input keys, see _get_plan
+        self._plans = {}
 
     def _check_unique_names(self):
         num_unique = len(set([o.name for o in self.objectives] + [c.name for c in self.constraints]))
@@ -46,50 +84,124 @@ class Problem(nn.Module):
             f'Name collision in input and output dictionaries, Input_keys: {input_dict.keys()},' \
             f'Output_keys: {output_dict.keys()}'
 
+    def _get_plan(self, kind, input_dict):
+        """
+        Look up the execution plan for calls of the given kind with the keys of input_dict, compiling it if needed.
+        Plans are keyed by the input keys and the component, objective and constraint modules, so that they are
+        recompiled if any of these change, and for forward calls by the requested outputs for the data name.
+
+        :param kind: (str) 'forward', 'step' or 'loss'
+        :param input_dict: (dict {str: torch.Tensor})
+        :return: (tuple) Cache key, plan, and whether the plan is new so that outputs must be validated
+        """
+        outputs = self._requested_outputs(input_dict.get('name')) if kind == 'forward' else None
+        key = (kind, frozenset(input_dict), tuple(map(id, self.components)),
+               tuple(map(id, self.objectives)), tuple(map(id, self.constraints)),
+               None if outputs is None else frozenset(outputs))
+        plan = self._plans.get(key)
+        if plan is None:
+            return key, self._compile(outputs), True
+        return key, plan, False
+
+    def _requested_outputs(self, name):
+        """
+        :param name: (str) Name of the data
+        :return: (list of str or None) Keys besides losses to return for the data, or None for all keys
+        """
+        if isinstance(self.outputs, dict):
+            return self.outputs.get(name)
+        return self.outputs
+
+    def _compile(self, outputs=None):
+        """
+        Compile an execution plan. If outputs are given, components are pruned by a backward pass over the keys
+        read by the objectives, constraints, and components, starting from the outputs. Components and loss terms
+        without declared input and output keys are assumed to depend on everything evaluated before them.
+
+        :param outputs: (list of str or None) Keys besides losses to return, or None for all keys
+        :return: (tuple) Components to evaluate; each objective and constraint with whether it must be evaluated
+                         (i.e. is not also a component whose output is already in the data dictionary);
+                         and the set of keys to return or None for all keys
+        """
+        components = list(self.components)
+        losses = [(term, term not in components) for term in [*self.objectives, *self.constraints]]
+        if outputs is None:
+            return components, losses, None
+        keep = {*outputs, 'loss', *[term.name for term, _ in losses]}
+
+        needed = set(outputs)
+        for term, evaluate in losses:
+            keys = _loss_keys(term)
+            if keys is None:
+                return components, losses, keep
+            needed |= keys if evaluate else {term.name}
+        run = []
+        for i in reversed(range(len(components))):
+            input_keys = getattr(components[i], 'input_keys', None)
+            output_keys = getattr(components[i], 'output_keys', None)
+            if input_keys is None or output_keys is None:
+                return components[:i + 1] + run, losses, keep
+            if needed & set(output_keys):
+                needed |= set(input_keys)
+                run.insert(0, components[i])
+        return run, losses, keep
+
+    def _run_components(self, data, components, validate):
+        """
+        Evaluate the given components in order, adding their outputs to data in place.
+        """
+        for component in components:
+            output_dict = component(data)
+            if isinstance(output_dict, torch.Tensor):
+                output_dict = {component.name: output_dict}
+            if validate:
+                self._check_name_collision_dicts(data, output_dict)
+            data.update(output_dict)
+        return data
+
+    def _run_losses(self, data, losses, validate):
+        """
+        Evaluate the objectives and constraints, adding their values and the total loss to data in place.
+        """
+        loss = 0.0
+        for term, evaluate in losses:
+            if evaluate:
+                output_dict = term(data)
+                if isinstance(output_dict, torch.Tensor):
+                    output_dict = {term.name: output_dict}
+                if validate:
+                    self._check_name_collision_dicts(data, output_dict)
+                data.update(output_dict)
+            loss += data[term.name]
+        data['loss'] = loss
+        return data
+
     def calculate_loss(self, input_dict: Dict[str, torch.Tensor]) -> torch.Tensor:
         """
 
         :param input_dict:
         :return:
         """
-        loss = 0.0
-        for objective in self.objectives:
-            if objective not in self.components:
-                output_dict = objective(input_dict)
-                if isinstance(output_dict, torch.Tensor):
-                    output_dict = {objective.name: output_dict}
-                self._check_name_collision_dicts(input_dict, output_dict)
-                input_dict = {**input_dict, **output_dict}
-            loss += input_dict[objective.name]
-        for constraint in self.constraints:
-            if constraint not in self.components:
-                output_dict = constraint(input_dict)
-                if isinstance(output_dict, torch.Tensor):
-                    output_dict = {constraint.name: output_dict}
-                self._check_name_collision_dicts(input_dict, output_dict)
-                input_dict = {**input_dict, **output_dict}
-            loss += input_dict[constraint.name]
-        input_dict['loss'] = loss
-        return input_dict
+        key, plan, validate = self._get_plan('loss', input_dict)
+        _, losses, _ = plan
+        output_dict = self._run_losses(dict(input_dict), losses, validate)
+        self._plans[key] = plan
+        return output_dict
 
     def forward(self, data: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
-        output_dict = self.step(data)
-
-        output_dict = self.calculate_loss(output_dict)
-        return {f'{data["name"]}_{k}': v for k, v in output_dict.items()}
+        key, plan, validate = self._get_plan('forward', data)
+        components, losses, keep = plan
+        output_dict = self._run_components(dict(data), components, validate)
+        output_dict = self._run_losses(output_dict, losses, validate)
+        self._plans[key] = plan
+        return {f'{data["name"]}_{k}': v for k, v in output_dict.items() if keep is None or k in keep}
 
     def step(self, input_dict: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
-        for component in self.components:
-            output_dict = component(input_dict)
-
-            if isinstance(output_dict, torch.Tensor):
-                output_dict = {component.name: output_dict}
-            self._check_name_collision_dicts(input_dict, output_dict)
-            assert set(output_dict.keys()) - set(input_dict.keys()) == set(output_dict.keys()), \
-                f'Name collision in input and output dictionaries, Input_keys: {input_dict.keys()},' \
-                f'Output_keys: {output_dict.keys()}'
-            input_dict = {**input_dict, **output_dict}
-        return input_dict
+        key, plan, validate = self._get_plan('step', input_dict)
+        components, _, _ = plan
+        output_dict = self._run_components(dict(input_dict), components, validate)
+        self._plans[key] = plan
+        return output_dict
 
     def __repr__(self):
         s = "### MODEL SUMMARY ###\n\nCOMPONENTS:"
@@ -0,0 +1,239 @@
+"""
+Hyperparameter sweeps running many small training jobs in a process pool.
+
+A sweep is defined by a search space over the arguments of an ArgParser (e.g. built from the parsers in
+neuromancer.arg) and a module level function fn(trial), which builds and trains a model from trial.args
+and trial.groups and returns a dictionary of results. Trials whose best eval metric is worse than the
+median of other trials at the same epoch can be stopped early via the callback given by trial.callback.
+
+.. code-block:: python
+
+    def train(trial):
+        ...
+        trainer = Trainer(problem, train_data, dev_data, test_data, optimizer, logger=logger,
+                          callback=trial.callback(SysIDCallback(simulator, visualizer)),
+                          epochs=trial.args.epochs, patience=trial.args.patience)
+        best_model = trainer.train()
+        return trainer.test(best_model)
+
+    if __name__ == '__main__':
+        parser = arg.ArgParser(parents=[arg.log(), arg.opt(), arg.data(), arg.loss(), arg.lin(), arg.ssm()])
+        space = {'lr': [0.001, 0.003, 0.01], 'nsteps': [8, 16, 32]}
+        results = run_sweep(train, parser, grid_search(space), workers=8)
+"""
+from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import multiprocessing
+import random
+
+import numpy as np
+import pandas as pd
+import torch
+
+from neuromancer.callbacks import Callback
+
+
+def grid_search(space):
+    """
+    Generate all combinations of values of a search space.
+
+    :param space: (dict {str: list or value}) Values to try for each argument. Non-list values are held constant.
+    :return: (list of dict {str: value}) Parameters of each trial
+    """
+    space = {k: v if isinstance(v, list) else [v] for k, v in space.items()}
+    return [dict(zip(space, values)) for values in itertools.product(*space.values())]
+
+
+def random_search(space, ntrials, seed=0):
+    """
+    Generate random samples of a search space.
+
+    :param space: (dict {str: list, callable or value}) Values to try for each argument: a list to choose from uniformly,
+                  a function of a random.Random instance returning a sample (e.g. lambda rng: 10 ** rng.uniform(-4, -2)),
+                  or a constant.
+    :param ntrials: (int) Number of samples
+    :param seed: (int) Random seed
+    :return: (list of dict {str: value}) Parameters of each trial
+    """
+    rng = random.Random(seed)
+
+    def sample(v):
+        if isinstance(v, list):
+            return rng.choice(v)
+        if callable(v):
+            return v(rng)
+        return v
+
+    return [{k: sample(v) for k, v in space.items()} for _ in range(ntrials)]
+
+
+class Trial:
+    """
+    One training job of a sweep, giving its arguments and its pruning state.
+    """
+    def __init__(self, id, params, args, groups, history=None, prune_warmup=0, min_trials=3):
+        """
+
+        :param id: (int) Index of the trial in the sweep. Can be used to name runs, e.g. of an MLFlowLogger.
+        :param params: (dict {str: value}) Arguments set by the search space
+        :param args: (Namespace) All arguments: parser defaults overridden by params
+        :param groups: (dict {str: Namespace}) Arguments of each argument group of the parser
+        :param history: (dict {int: dict {int: float}}) Best eval metric of each trial by epoch, shared between
+                        processes. None disables pruning.
+        :param prune_warmup: (int) Number of epochs before a trial can be pruned
+        :param min_trials: (int) Number of other trials which must have reached an epoch to prune a trial at that epoch
+        """
+        self.id = id
+        self.params = params
+        self.args = args
+        self.groups = groups
+        self.history = history
+        self.prune_warmup = prune_warmup
+        self.min_trials = min_trials
+        self.pruned = False
+
+    def callback(self, callback=Callback()):
+        """
+        :param callback: (nm.Callback) Callback of the training job
+        :return: (TrialCallback) Callback to pass to the Trainer of this trial
+        """
+        return TrialCallback(self, callback)
+
+    def report(self, epoch, best, minimize=True):
+        """
+        Record the best eval metric of this trial so far and decide whether to stop it.
+
+        :param epoch: (int) Current epoch
+        :param best: (float) Best eval metric so far
+        :param minimize: (bool) Whether lower eval metrics are better
+        :return: (bool) Whether the trial should be pruned
+        """
+        if self.history is None:
+            return False
+        # proxies of shared dictionaries do not see in-place changes of their values, so reassign
+        reports = dict(self.history.get(self.id, {}))
+        reports[epoch] = best
+        self.history[self.id] = reports
+        if epoch < self.prune_warmup:
+            return False
+
+        # best eval metric at this epoch of the other trials which have reached it
+        others = [reports[max(e for e in reports if e <= epoch)]
+                  for id, reports in self.history.items()
+                  if id != self.id and min(reports) <= epoch <= max(reports)]
+        if len(others) < self.min_trials:
+            return False
+        median = np.median(others)
+        return best > median if minimize else best < median
+
+
+class TrialCallback(Callback):
+    """
+    Callback which reports the best eval metric of a trial after every evaluation and stops training of trials
+    whose best eval metric is worse than the median of other trials at the same epoch. Training behavior is
+    otherwise given by the wrapped callback.
+    """
+    def __init__(self, trial, callback=Callback()):
+        """
+
+        :param trial: (Trial)
+        :param callback: (nm.Callback) Callback of the training job
+        """
+        super().__init__()
+        self.trial, self.callback = trial, callback
+
+    def begin_train(self, trainer):
+        self.callback.begin_train(trainer)
+
+    def begin_epoch(self, trainer, output):
+        self.callback.begin_epoch(trainer, output)
+
+    def begin_eval(self, trainer, output):
+        self.callback.begin_eval(trainer, output)
+
+    def end_batch(self, trainer, output):
+        self.callback.end_batch(trainer, output)
+
+    def end_eval(self, trainer, output):
+        self.callback.end_eval(trainer, output)
+        if self.trial.report(trainer.current_epoch, float(trainer.best_devloss), trainer._eval_min):
+            self.trial.pruned = True
+            # stop training through the Trainer's early stopping
+            trainer.badcount = trainer.patience + 1
+
+    def end_epoch(self, trainer, output):
+        self.callback.end_epoch(trainer, output)
+
+    def end_train(self, trainer, output):
+        self.callback.end_train(trainer, output)
+
+    def begin_test(self, trainer):
+        self.callback.begin_test(trainer)
+
+    def end_test(self, trainer, output):
+        self.callback.end_test(trainer, output)
+
+
+def _init_worker(num_threads):
+    torch.set_num_threads(num_threads)
+
+
+def _scalars(results):
+    """
+    Keep the scalar entries of a dictionary of results, converting tensors to numbers.
+    """
+    scalars = {}
+    for k, v in (results or {}).items():
+        if isinstance(v, torch.Tensor) and v.numel() == 1:
+            scalars[k] = v.item()
+        elif isinstance(v, (int, float, str, bool, np.number)):
+            scalars[k] = v
+    return scalars
+
+
+def _run_trial(fn, trial):
+    try:
+        results, error = fn(trial), None
+    except Exception as e:
+        results, error = {}, repr(e)
+    return {"trial": trial.id, **trial.params, **_scalars(results), "pruned": trial.pruned, "error": error}
+
+
+def run_sweep(fn, parser, trials, argv=(), workers=None, num_threads=1, prune=True, prune_warmup=0, min_trials=3):
+    """
+    Run fn(trial) for each set of parameters in a process pool and collect the results in one table.
+
+    :param fn: (callable) Picklable (module level) function training a model for a Trial and returning a dictionary
+                          of results, e.g. the output of Trainer.test. Scalar results become columns of the table.
+    :param parser: (arg.ArgParser) Parser defining all arguments of fn
+    :param trials: (list of dict {str: value}) Parameters of each trial, e.g. from grid_search or random_search
+    :param argv: (list of str) Command line arguments shared by all trials
+    :param workers: (int) Number of processes; defaults to the number of cores divided by num_threads
+    :param num_threads: (int) Number of torch threads per process
+    :param prune: (bool) Whether trials using trial.callback can be stopped early
+    :param prune_warmup: (int) Number of epochs before a trial can be pruned
+    :param min_trials: (int) Number of other trials which must have reached an epoch to prune a trial at that epoch
+    :return: (pandas.DataFrame) One row per trial with its parameters, scalar results, whether it was pruned,
+             and the error it raised if any
+    """
+    base = parser.parse_args(list(argv))
+    for params in trials:
+        unknown = set(params) - set(vars(base))
+        assert not unknown, f"Unknown arguments in search space: {sorted(unknown)}"
+    workers = workers or max(1, (multiprocessing.cpu_count() or 1) // num_threads)
+
+    # spawn rather than fork workers, since forking a process which has used torch's thread pools can deadlock
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager:
+        history = manager.dict() if prune else None
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(num_threads,)) as pool:
+            futures = []
+            for id, params in enumerate(trials):
+                args = Namespace(**{**vars(base), **params})
+                trial = Trial(id, params, args, parser.arg_groups(args), history=history,
+                              prune_warmup=prune_warmup, min_trials=min_trials)
+                futures.append(pool.submit(_run_trial, fn, trial))
+            rows = [future.result() for future in futures]
+    return pd.DataFrame(rows)
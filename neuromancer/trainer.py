@@ -2,7 +2,13 @@
 
 
 """
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
+from queue import Queue, Full
+import os
+import threading
+import time
 
 import torch
 from torch.optim.lr_scheduler import ReduceLROnPlateau
@@ -13,8 +19,206 @@ from neuromancer.problem import Problem
 from neuromancer.callbacks import Callback
 
 
-def move_batch_to_device(batch, device="cpu"):
-    return {k: v.to(device) if isinstance(v, torch.Tensor) else v for k, v in batch.items()}
+def move_batch_to_device(batch, device="cpu", non_blocking=False):
+    return {k: v.to(device, non_blocking=non_blocking) if isinstance(v, torch.Tensor) else v for k, v in batch.items()}
+
+
+class ResidentLoader:
+    """
+    Wraps a data loader whose batches are the same every epoch, e.g. the full-batch DataLoaders used by most
+    training scripts. Batches are collated and moved to the target device once at construction and the same
+    batches are handed out every epoch, so the Trainer neither re-collates nor re-transfers them.
+    """
+    def __init__(self, loader, device="cpu"):
+        """
+
+        :param loader: (torch DataLoader) Loader of batch dictionaries; must not shuffle or otherwise vary between epochs
+        :param device: (str) String denoting device to place batches on.
+        """
+        self.dataset = getattr(loader, "dataset", None)
+        self.device = device
+        self.batches = [move_batch_to_device(batch, device) for batch in loader]
+
+    def __iter__(self):
+        # shallow copies so that keys added to a batch during a forward pass do not persist across epochs
+        return (dict(batch) for batch in self.batches)
+
+    def __len__(self):
+        return len(self.batches)
+
+
+class Prefetcher:
+    """
+    Wraps a data loader to prepare batches in a background thread: while the model computes on one batch,
+    the following batches are fetched, collated, optionally transformed (e.g. augmented with noise), and
+    moved to the target device. Batches bound for a CUDA device are pinned and copied asynchronously.
+    """
+    def __init__(self, loader, device="cpu", depth=1, transform=None):
+        """
+
+        :param loader: (torch DataLoader) Loader of batch dictionaries
+        :param device: (str) String denoting device to place batches on.
+        :param depth: (int) Maximum number of batches prepared ahead of the batch being consumed
+        :param transform: (callable) Optional function applied to each batch dictionary after it is moved to device
+        """
+        self.loader = loader
+        self.dataset = getattr(loader, "dataset", None)
+        self.device = device
+        self.depth = depth
+        self.transform = transform
+
+    def _prepare(self, batch):
+        if str(self.device).startswith("cuda"):
+            batch = {k: v.pin_memory() if isinstance(v, torch.Tensor) else v for k, v in batch.items()}
+            batch = move_batch_to_device(batch, self.device, non_blocking=True)
+        else:
+            batch = move_batch_to_device(batch, self.device)
+        return batch if self.transform is None else self.transform(batch)
+
+    def __iter__(self):
+        queue = Queue(maxsize=self.depth)
+        stop = threading.Event()
+        done = object()
+
+        def put(item):
+            # give up if the consumer stopped iterating, e.g. at early stopping
+            while not stop.is_set():
+                try:
+                    queue.put(item, timeout=0.1)
+                    return True
+                except Full:
+                    pass
+            return False
+
+        def produce():
+            try:
+                for batch in self.loader:
+                    if not put(self._prepare(batch)):
+                        return
+            except Exception as e:
+                put(e)
+                return
+            put(done)
+
+        thread = threading.Thread(target=produce, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = queue.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            thread.join()
+
+    def __len__(self):
+        return len(self.loader)
+
+
+class _RunningMean:
+    """
+    Mean of a sequence of scalar tensors, accumulated detached and in place on their device so that neither
+    autograd graphs nor per-batch tensors are kept alive across an epoch.
+    """
+    def __init__(self):
+        self.total = None
+        self.count = 0
+
+    def update(self, value):
+        value = value.detach()
+        if self.total is None:
+            self.total = value.clone()
+        else:
+            self.total.add_(value)
+        self.count += 1
+
+    def mean(self):
+        return self.total / self.count
+
+
+def _clone_state_dict(state_dict):
+    """
+    Copy a state dict into newly allocated tensors, to be updated in place with _copy_state_dict_.
+    """
+    clone = OrderedDict(
+        (k, v.detach().clone() if isinstance(v, torch.Tensor) else deepcopy(v)) for k, v in state_dict.items()
+    )
+    clone._metadata = deepcopy(getattr(state_dict, "_metadata", None))
+    return clone
+
+
+def _copy_state_dict_(dst, src):
+    """
+    Copy a state dict in place into one allocated by _clone_state_dict. Entries which changed shape, dtype, or device
+    (or are not tensors) are replaced by copies instead.
+    """
+    for k, v in src.items():
+        target = dst.get(k)
+        if isinstance(v, torch.Tensor) and isinstance(target, torch.Tensor) \
+                and target.shape == v.shape and target.dtype == v.dtype and target.device == v.device:
+            target.copy_(v)
+        else:
+            dst[k] = v.detach().clone() if isinstance(v, torch.Tensor) else deepcopy(v)
+    return dst
+
+
+def _cpu_snapshot(obj):
+    """
+    Recursively copy the tensors in a (nested) state dict to CPU, so that the copy can be written to disk
+    in the background while training continues to update the originals.
+    """
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        snapshot = OrderedDict((k, _cpu_snapshot(v)) for k, v in obj.items())
+        if hasattr(obj, "_metadata"):
+            snapshot._metadata = deepcopy(obj._metadata)
+        return snapshot
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_cpu_snapshot(v) for v in obj)
+    return deepcopy(obj)
+
+
+def _save_checkpoint(checkpoint, path):
+    """
+    Write a checkpoint to a temporary file and move it into place, so that an interrupted write
+    never corrupts the previous checkpoint.
+    """
+    tmp_path = f"{path}.tmp"
+    torch.save(checkpoint, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _set_loader_epoch(loader, epoch):
+    """
+    Seed the shuffling of a data loader for the given epoch, if it (or a sampler it wraps) supports set_epoch,
+    as WindowSampler and torch's DistributedSampler do.
+    """
+    loader = getattr(loader, "loader", loader)
+    for sampler in [getattr(loader, "sampler", None), getattr(loader, "batch_sampler", None)]:
+        while sampler is not None:
+            if hasattr(sampler, "set_epoch"):
+                sampler.set_epoch(epoch)
+                return
+            sampler = getattr(sampler, "sampler", None)
+
+
+def _device_batches(loader, device="cpu", prefetch=0, transform=None):
+    """
+    Iterate over the batches of a loader placed on the given device, preparing up to prefetch batches
+    ahead in a background thread. The optional transform is applied to each batch, in the background
+    thread when prefetching.
+    """
+    if isinstance(loader, (ResidentLoader, Prefetcher)):
+        batches = iter(loader)
+    elif prefetch > 0:
+        return iter(Prefetcher(loader, device, depth=prefetch, transform=transform))
+    else:
+        batches = (move_batch_to_device(batch, device) for batch in loader)
+    return batches if transform is None else map(transform, batches)
 
 
 class Trainer:
@@ -42,7 +246,16 @@ class Trainer:
         eval_metric="loop_dev_loss",
         eval_mode="min",
         clip=100.0,
-        device="cpu"
+        device="cpu",
+        resident_data=False,
+        prefetch=0,
+        prefetch_transform=None,
+        accumulate_steps=1,
+        checkpoint_path=None,
+        checkpoint_every=1,
+        eval_every=1,
+        adaptive_eval=False,
+        eval_budget=None,
     ):
         """
 
@@ -65,9 +278,31 @@ class Trainer:
                                 the trainer will maximize the train metric.
         :param clip: (float) Limit for gradient clipping
         :param device: (str) String denoting device to place computations on. Can be 'cpu' or 'gpu:N' for some integer N
+        :param resident_data: (bool) Whether to collate and move all data to device once before training (see ResidentLoader).
+                                     Only appropriate for loaders which produce the same batches every epoch.
+        :param prefetch: (int) Number of batches to prepare ahead in a background thread while the model computes (see Prefetcher).
+                               Default 0 prepares each batch when it is needed.
+        :param prefetch_transform: (callable) Optional function applied to each training batch dictionary after it is moved to device,
+                                              e.g. to augment data with noise. Runs in the prefetch thread when prefetch > 0.
+        :param accumulate_steps: (int) Number of micro-batches to accumulate gradients over before each clipping and optimizer step.
+                                       Losses are scaled by 1/accumulate_steps so each step uses the mean gradient of its micro-batches.
+        :param checkpoint_path: (str) File to periodically write resumable training state to (see Trainer.resume).
+                                      Default None disables checkpointing.
+        :param checkpoint_every: (int) Number of epochs between checkpoints.
+        :param eval_every: (int) Number of epochs between evaluations on dev data (including callback begin_eval/end_eval).
+                                 Epochs without improvement count towards patience whether or not they were evaluated.
+        :param adaptive_eval: (bool) Whether to double the number of epochs between evaluations after each evaluation without
+                                     improvement, up to max(eval_every, patience). Resets to eval_every on improvement.
+        :param eval_budget: (float) Optional fraction of wall-clock training time which may be spent evaluating.
+                                    Evaluations due by eval_every are postponed while over budget.
         """
+        assert accumulate_steps >= 1, "accumulate_steps must be a positive integer"
         self.model = problem
+        # module called for training forward passes, e.g. a DistributedDataParallel wrapper of the problem
+        self._train_model = problem
         self.optimizer = optimizer
+        if resident_data:
+            train_data, dev_data, test_data = [ResidentLoader(d, device) for d in [train_data, dev_data, test_data]]
         self.train_data = train_data
         self.dev_data = dev_data
         self.test_data = test_data
@@ -87,61 +322,104 @@ class Trainer:
         self.badcount = 0
         self.clip = clip
         self.best_devloss = np.finfo(np.float32).max if self._eval_min else 0.
-        self.best_model = deepcopy(self.model.state_dict())
+        self.best_model = _clone_state_dict(self.model.state_dict())
         self.device = device
+        self.prefetch = prefetch
+        self.prefetch_transform = prefetch_transform
+        self.accumulate_steps = accumulate_steps
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+        self.start_epoch = 0
+        self.eval_every = eval_every
+        self.adaptive_eval = adaptive_eval
+        self.eval_budget = eval_budget
+        self._checkpoint_executor = None
+        self._checkpoint_future = None
+        # (last evaluated epoch, epochs between evaluations) restored by resume for the next call to train
+        self._resumed_eval_state = None
 
     def train(self):
         """
-        Optimize model according to train_metric and validate per-epoch according to eval_metric.
+        Optimize model according to train_metric and validate every eval_every epochs according to eval_metric.
         Trains for self.epochs and terminates early if self.patience threshold is exceeded.
+
+        :return: (dict) State dict of the best model. This is a buffer which is updated in place, so further training
+                        with this Trainer overwrites it.
         """
         self.callback.begin_train(self)
 
-        for i in range(self.epochs):
+        output = {}
+        self._last_eval, self._eval_interval = self._resumed_eval_state or (self.start_epoch - 1, self.eval_every)
+        self._resumed_eval_state = None
+        self._eval_time = 0.
+        self._train_start = time.perf_counter()
+        for i in range(self.start_epoch, self.epochs):
             self.current_epoch = i
+            _set_loader_epoch(self.train_data, i)
             self.model.train()
-            losses = []
-            for t_batch in self.train_data:
-                t_batch = move_batch_to_device(t_batch, self.device)
-                output = self.model(t_batch)
-                self.optimizer.zero_grad()
-                output[self.train_metric].backward()
-                torch.nn.utils.clip_grad_norm_(self.model.parameters(), self.clip)
-                self.optimizer.step()
-                losses.append(output[self.train_metric])
+            losses = _RunningMean()
+            self.optimizer.zero_grad()
+            accumulated = 0
+            for t_batch in _device_batches(self.train_data, self.device, self.prefetch, self.prefetch_transform):
+                output = self._train_model(t_batch)
+                (output[self.train_metric] / self.accumulate_steps).backward()
+                accumulated += 1
+                if accumulated == self.accumulate_steps:
+                    self._optimizer_step()
+                    accumulated = 0
+                losses.update(output[self.train_metric])
                 self.callback.end_batch(self, output)
+            if accumulated > 0:
+                # leftover micro-batches were scaled by 1/accumulate_steps; rescale to the mean of their gradients
+                for p in self.model.parameters():
+                    if p.grad is not None:
+                        p.grad.mul_(self.accumulate_steps / accumulated)
+                self._optimizer_step()
 
-            output[f'mean_{self.train_metric}'] = torch.mean(torch.stack(losses))
+            output[f'mean_{self.train_metric}'] = losses.mean()
+            output = self._sync_metrics(output)
             self.callback.begin_epoch(self, output)
 
             if self.lr_scheduler is not None:
                 self.lr_scheduler.step(output[f'mean_{self.train_metric}'])
 
             with torch.set_grad_enabled(self.model.grad_inference):
-                self.model.eval()
-                losses = []
-                for d_batch in self.dev_data:
-                    d_batch = move_batch_to_device(d_batch, self.device)
-                    eval_output = self.model(d_batch)
-                    losses.append(eval_output[self.dev_metric])
-                eval_output[f'mean_{self.dev_metric}'] = torch.mean(torch.stack(losses))
-                output = {**output, **eval_output}
-                self.callback.begin_eval(self, output)
-
-                if (self._eval_min and output[self.eval_metric] < self.best_devloss)\
-                        or (not self._eval_min and output[self.eval_metric] > self.best_devloss):
-                    self.best_model = deepcopy(self.model.state_dict())
-                    self.best_devloss = output[self.eval_metric]
-                    self.badcount = 0
-                else:
-                    if i > self.warmup:
-                        self.badcount += 1
-                self.logger.log_metrics(output, step=i)
+                if self._should_eval(i):
+                    eval_start = time.perf_counter()
+                    self.model.eval()
+                    losses = _RunningMean()
+                    for d_batch in _device_batches(self.dev_data, self.device, self.prefetch):
+                        eval_output = self.model(d_batch)
+                        losses.update(eval_output[self.dev_metric])
+                    eval_output[f'mean_{self.dev_metric}'] = losses.mean()
+                    output = {**output, **eval_output}
+                    self.callback.begin_eval(self, output)
+                    output = self._sync_metrics(output)
 
-                self.callback.end_eval(self, output)
+                    if (self._eval_min and output[self.eval_metric] < self.best_devloss)\
+                            or (not self._eval_min and output[self.eval_metric] > self.best_devloss):
+                        _copy_state_dict_(self.best_model, self.model.state_dict())
+                        self.best_devloss = output[self.eval_metric]
+                        self.badcount = 0
+                        self._eval_interval = self.eval_every
+                    else:
+                        # every epoch since the last evaluation past warmup counts towards patience
+                        self.badcount += max(0, i - max(self._last_eval, self.warmup))
+                        if self.adaptive_eval:
+                            self._eval_interval = min(2 * self._eval_interval, max(self.eval_every, self.patience))
+                    self._last_eval = i
+                    self.logger.log_metrics(output, step=i)
+
+                    self.callback.end_eval(self, output)
+                    self._eval_time += time.perf_counter() - eval_start
+                else:
+                    self.logger.log_metrics(output, step=i)
 
                 self.callback.end_epoch(self, output)
 
+                if self.checkpoint_path is not None and (i + 1) % self.checkpoint_every == 0:
+                    self.checkpoint(i)
+
                 if self.badcount > self.patience:
                     break
 
@@ -151,8 +429,95 @@ class Trainer:
             "best_model_state_dict.pth": self.best_model,
             "best_model.pth": self.model,
         })
+        self._wait_checkpoint()
+        if self._checkpoint_executor is not None:
+            self._checkpoint_executor.shutdown()
+            self._checkpoint_executor = None
         return self.best_model
 
+    def checkpoint(self, epoch):
+        """
+        Write the state needed to resume training after the given epoch to self.checkpoint_path. The state is
+        copied to CPU on the calling thread and written to disk by a background thread; a checkpoint still being
+        written is waited for first, so at most one snapshot is held in memory.
+
+        :param epoch: (int) Last completed epoch
+        """
+        self._wait_checkpoint()
+        checkpoint = _cpu_snapshot({
+            "epoch": epoch,
+            "model": self.model.state_dict(),
+            "optimizer": self.optimizer.state_dict(),
+            "lr_scheduler": self.lr_scheduler.state_dict() if self.lr_scheduler is not None else None,
+            "best_model": self.best_model,
+            "best_devloss": float(self.best_devloss),
+            "badcount": self.badcount,
+            "last_eval": self._last_eval,
+            "eval_interval": self._eval_interval,
+        })
+        if self._checkpoint_executor is None:
+            self._checkpoint_executor = ThreadPoolExecutor(max_workers=1)
+        self._checkpoint_future = self._checkpoint_executor.submit(_save_checkpoint, checkpoint, self.checkpoint_path)
+
+    def _wait_checkpoint(self):
+        """
+        Block until the checkpoint being written (if any) is on disk, re-raising any error from writing it.
+        """
+        future, self._checkpoint_future = self._checkpoint_future, None
+        if future is not None:
+            future.result()
+
+    def resume(self, path):
+        """
+        Restore training state from a checkpoint written by Trainer.checkpoint. A subsequent call to train
+        continues from the epoch after the checkpointed one, including the evaluation cadence of adaptive_eval
+        and the epochs since the last evaluation which count towards patience.
+
+        :param path: (str) Checkpoint file
+        :return: (Trainer) self
+        """
+        checkpoint = torch.load(path, map_location=self.device)
+        self.model.load_state_dict(checkpoint["model"])
+        self.optimizer.load_state_dict(checkpoint["optimizer"])
+        if self.lr_scheduler is not None and checkpoint["lr_scheduler"] is not None:
+            self.lr_scheduler.load_state_dict(checkpoint["lr_scheduler"])
+        self.best_model = _clone_state_dict(checkpoint["best_model"])
+        self.best_devloss = checkpoint["best_devloss"]
+        self.badcount = checkpoint["badcount"]
+        self.start_epoch = checkpoint["epoch"] + 1
+        self.current_epoch = checkpoint["epoch"]
+        self._resumed_eval_state = (checkpoint["last_eval"], checkpoint["eval_interval"])
+        return self
+
+    def _sync_metrics(self, output):
+        """
+        Combine metrics computed by separate training processes. A single process has nothing to combine.
+
+        :param output: (dict {str: tensor}) Output dictionary of the problem
+        :return: (dict {str: tensor})
+        """
+        return output
+
+    def _should_eval(self, epoch):
+        """
+        Whether to evaluate on dev data at the end of the given epoch. The final epoch is always evaluated.
+        """
+        if epoch == self.epochs - 1:
+            return True
+        if epoch - self._last_eval < self._eval_interval:
+            return False
+        if self.eval_budget is not None:
+            return self._eval_time <= self.eval_budget * (time.perf_counter() - self._train_start)
+        return True
+
+    def _optimizer_step(self):
+        """
+        Clip accumulated gradients, take an optimizer step, and reset gradients.
+        """
+        torch.nn.utils.clip_grad_norm_(self.model.parameters(), self.clip)
+        self.optimizer.step()
+        self.optimizer.zero_grad()
+
     def test(self, best_model):
         """
         Evaluate the model on all data splits.
@@ -165,14 +530,14 @@ class Trainer:
             output = {}
             for dset, metric in zip([self.train_data, self.dev_data, self.test_data],
                                     [self.train_metric, self.dev_metric, self.test_metric]):
-                losses = []
-                for batch in dset:
-                    batch = move_batch_to_device(batch, self.device)
+                losses = _RunningMean()
+                for batch in _device_batches(dset, self.device, self.prefetch):
                     batch_output = self.model(batch)
-                    losses.append(batch_output[metric])
-                output[f'mean_{metric}'] = torch.mean(torch.stack(losses))
+                    losses.update(batch_output[metric])
+                output[f'mean_{metric}'] = losses.mean()
                 output = {**output, **batch_output}
 
+        output = self._sync_metrics(output)
         self.callback.end_test(self, output)
         self.logger.log_metrics({f"best_{k}": v for k, v in output.items()})
 
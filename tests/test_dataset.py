@@ -0,0 +1,306 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import multiprocessing
+import os
+
+import numpy as np
+import pandas as pd
+import torch
+from torch.utils.data import DataLoader
+
+from neuromancer import dataset
+from neuromancer.dataset import (
+    SequenceDataset,
+    StaticDataset,
+    ChunkedStaticDataset,
+    ChunkSampler,
+    MemmapSequenceDataset,
+    NormStats,
+    SampledDataset,
+    StreamingSequenceDataset,
+    WindowSampler,
+    get_batch_dataloader,
+    get_sequence_datasets,
+    get_static_datasets,
+    normalize_batch,
+    normalize_data,
+    norm_fns,
+    read_file,
+    split_sequence_data,
+    split_static_data,
+    write_memmap,
+    write_static_chunks,
+    _split_by_id,
+)
+
+
+def get_sequence_data(nsim=100, nsequences=None):
+    def sequence():
+        return {
+            "Y": np.random.rand(nsim, 3),
+            "U": np.random.rand(nsim, 2),
+        }
+    return sequence() if nsequences is None else [sequence() for _ in range(nsequences)]
+
+
+def assert_batches_equal(b1, b2):
+    assert set(b1.keys()) == set(b2.keys())
+    for k, v in b1.items():
+        if isinstance(v, torch.Tensor):
+            assert torch.equal(v, b2[k]), k
+        else:
+            assert v == b2[k], k
+
+
+def test_memmap_sequence_dataset_matches_in_memory(tmp_path):
+    data = get_sequence_data()
+    write_memmap(data, str(tmp_path))
+    for moving_horizon in [False, True]:
+        dset = SequenceDataset(data, nsteps=8, moving_horizon=moving_horizon)
+        mmset = MemmapSequenceDataset(str(tmp_path), nsteps=8, moving_horizon=moving_horizon)
+        assert len(dset) == len(mmset)
+        assert_batches_equal(dset[3], mmset[3])
+        assert_batches_equal(dset.get_full_batch(), mmset.get_full_batch())
+        assert_batches_equal(dset.get_full_sequence(), mmset.get_full_sequence())
+
+
+def test_memmap_multisequence_dataset_matches_in_memory(tmp_path):
+    data = get_sequence_data(nsim=40, nsequences=3)
+    write_memmap(data, str(tmp_path))
+    dset = SequenceDataset(data, nsteps=4)
+    mmset = MemmapSequenceDataset(str(tmp_path), nsteps=4)
+    assert mmset.multisequence
+    assert_batches_equal(dset.get_full_batch(), mmset.get_full_batch())
+    for s1, s2 in zip(dset.get_full_sequence(), mmset.get_full_sequence()):
+        assert_batches_equal(s1, s2)
+
+
+def test_streaming_sequence_dataset_matches_in_memory():
+    data = get_sequence_data()
+    bounds = [0, 7, 8, 30, 61, 100]
+    for moving_horizon in [False, True]:
+        chunks = ({k: v[a:b] for k, v in data.items()} for a, b in zip(bounds[:-1], bounds[1:]))
+        dset = SequenceDataset(data, nsteps=8, moving_horizon=moving_horizon)
+        stream = StreamingSequenceDataset(chunks, nsteps=8, moving_horizon=moving_horizon)
+        samples = list(stream)
+        assert len(samples) == len(dset)
+        for i, sample in enumerate(samples):
+            assert_batches_equal(sample, dset[i])
+
+
+def test_read_file_cache(tmp_path):
+    data = {"y1": np.random.rand(20), "u1": np.random.rand(20), "exp_id": np.repeat([0, 1], 10)}
+    csv_path = tmp_path / "run.csv"
+    pd.DataFrame(data).to_csv(csv_path, index=False)
+    cache_dir = str(tmp_path / "cache")
+
+    parsed = read_file(str(csv_path))
+    for _ in range(2):
+        cached = read_file(str(csv_path), cache_dir=cache_dir)
+        assert len(cached) == len(parsed)
+        for d1, d2 in zip(parsed, cached):
+            assert set(d1.keys()) == set(d2.keys())
+            assert all(np.array_equal(d1[k], d2[k]) for k in d1)
+
+
+def test_read_file_workers(tmp_path):
+    for i in range(4):
+        data = {"y1": np.random.rand(20), "exp_id": np.repeat([0, 1], 10)}
+        pd.DataFrame(data).to_csv(tmp_path / f"run{i}.csv", index=False)
+
+    serial = read_file(str(tmp_path))
+    parallel = read_file(str(tmp_path), workers=2)
+    assert len(serial) == len(parallel) == 4
+    for s1, s2 in zip(serial, parallel):
+        for d1, d2 in zip(s1, s2):
+            assert np.array_equal(d1["Y"], d2["Y"])
+
+
+def _read_pid(file_path):
+    return {"Y": np.full((1, 1), os.getpid())}
+
+
+def test_read_file_workers_use_pool(tmp_path, monkeypatch):
+    for i in range(4):
+        pd.DataFrame({"y1": np.random.rand(5)}).to_csv(tmp_path / f"run{i}.csv", index=False)
+    # fork so that workers see the patched reader
+    monkeypatch.setattr(dataset, "_read_file", _read_pid)
+    monkeypatch.setattr(dataset, "ProcessPoolExecutor",
+                        partial(ProcessPoolExecutor, mp_context=multiprocessing.get_context("fork")))
+    pids = {int(d["Y"][0, 0]) for d in read_file(str(tmp_path), workers=2)}
+    assert os.getpid() not in pids
+    assert {int(d["Y"][0, 0]) for d in read_file(str(tmp_path))} == {os.getpid()}
+
+
+def test_split_by_id():
+    # contiguous blocks are split into views, interleaved IDs by reordering
+    contiguous = np.repeat(np.random.permutation(1000), 5)
+    for ids in [np.repeat([3, 1, 2], 5), np.random.randint(0, 4, size=50),
+                contiguous, np.random.permutation(contiguous)]:
+        data = {"Y": np.random.rand(len(ids), 2), "U": np.random.rand(len(ids), 1)}
+        split = _split_by_id(data, ids.reshape(-1, 1))
+        expected = [{k: v[ids == i] for k, v in data.items()} for i in sorted(set(ids))]
+        assert len(split) == len(expected)
+        for d1, d2 in zip(split, expected):
+            assert all(np.array_equal(d1[k], d2[k]) for k in data)
+
+
+def test_split_by_id_empty():
+    assert _split_by_id({"Y": np.empty((0, 2))}, np.empty((0, 1))) == []
+
+
+def test_batch_dataloader_matches_collate():
+    for dset in [
+        SequenceDataset(get_sequence_data(), nsteps=4, name="train"),
+        SequenceDataset(get_sequence_data(), nsteps=4, moving_horizon=True, name="train"),
+        StaticDataset(get_sequence_data(), name="train"),
+    ]:
+        loader = DataLoader(dset, batch_size=16, shuffle=False, collate_fn=dset.collate_fn)
+        batch_loader = get_batch_dataloader(dset, batch_size=16)
+        assert len(loader) == len(batch_loader)
+        for b1, b2 in zip(loader, batch_loader):
+            assert_batches_equal(b1, b2)
+
+
+def test_lazy_sequence_dataset_matches_eager():
+    for data in [get_sequence_data(), get_sequence_data(nsim=40, nsequences=3)]:
+        for moving_horizon in [False, True]:
+            eager = SequenceDataset(data, nsteps=4, moving_horizon=moving_horizon, lazy=False)
+            lazy = SequenceDataset(data, nsteps=4, moving_horizon=moving_horizon, lazy=True)
+            assert lazy.batched_data is None
+            assert len(eager) == len(lazy)
+            assert_batches_equal(eager[5], lazy[5])
+            assert_batches_equal(eager[[0, 3, 7]], lazy[[0, 3, 7]])
+            assert_batches_equal(eager.get_full_batch(), lazy.get_full_batch())
+
+
+def test_norm_stats_match_normalize_data(tmp_path):
+    data = get_sequence_data(nsim=40, nsequences=3)
+    accumulated = NormStats()
+    for d in data:
+        for a, b in [(0, 11), (11, 12), (12, 40)]:
+            accumulated.update({k: v[a:b] for k, v in d.items()})
+    accumulated.save(str(tmp_path / "stats.npz"))
+    loaded = NormStats.load(str(tmp_path / "stats.npz"))
+
+    for norm_type in ["zscore", "zero-one", "one-one"]:
+        norm_data, stats = normalize_data(data, norm_type)
+        for acc in [accumulated, loaded]:
+            acc_stats = acc.get_stats(norm_type)
+            assert set(stats.keys()) == set(acc_stats.keys())
+            assert all(np.allclose(stats[k], acc_stats[k]) for k in stats)
+
+        batch = {k: torch.tensor(v, dtype=torch.float) for k, v in data[0].items()}
+        norm_batch = normalize_batch(batch, norm_type, accumulated.get_stats(norm_type))
+        for k, v in norm_data[0].items():
+            assert torch.allclose(norm_batch[k], torch.tensor(v, dtype=torch.float), atol=1e-5)
+
+
+def test_norm_fns_preserve_dtype_and_normalize_in_place():
+    M = np.random.rand(50, 3).astype(np.float32)
+    expected = {
+        "zscore": (M - M.mean(axis=0)) / M.std(axis=0),
+        "zero-one": (M - M.min(axis=0)) / (M.max(axis=0) - M.min(axis=0)),
+        "one-one": 2 * ((M - M.min(axis=0)) / (M.max(axis=0) - M.min(axis=0))) - 1,
+    }
+    for norm_type, fn in norm_fns.items():
+        norm, _, _ = fn(M)
+        assert norm.dtype == np.float32
+        assert np.allclose(norm, expected[norm_type], atol=1e-6)
+
+        M_copy = M.copy()
+        norm, _, _ = fn(M_copy, out=M_copy)
+        assert norm is M_copy
+        assert np.allclose(norm, expected[norm_type], atol=1e-6)
+
+
+def test_split_datasets_are_views_matching_split_data():
+    for data in [get_sequence_data(), get_sequence_data(nsim=40, nsequences=6)]:
+        for moving_horizon in [False, True]:
+            splits = split_sequence_data(data, 4)
+            views = get_sequence_datasets(data, 4, moving_horizon=moving_horizon)
+            storage = views[0].full_data.untyped_storage().data_ptr()
+            for split, view in zip(splits, views):
+                dset = SequenceDataset(split, nsteps=4, moving_horizon=moving_horizon, name=view.name)
+                assert view.full_data.untyped_storage().data_ptr() == storage
+                assert len(dset) == len(view)
+                assert_batches_equal(dset.get_full_batch(), view.get_full_batch())
+
+    data = get_sequence_data()
+    for split, view in zip(split_static_data(data), get_static_datasets(data)):
+        assert_batches_equal(StaticDataset(split, name=view.name).get_full_batch(), view.get_full_batch())
+
+
+def test_window_sampler_is_seeded_and_covers_dataset():
+    dset = SequenceDataset(get_sequence_data(nsim=40, nsequences=3), nsteps=2)
+    for stratify in [False, True]:
+        epochs = [list(WindowSampler(dset, 8, seed=1, stratify=stratify)) for _ in range(2)]
+        assert epochs[0] == epochs[1]
+
+        sampler = WindowSampler(dset, 8, seed=1, stratify=stratify)
+        first, second = list(sampler), list(sampler)
+        assert first != second
+        for batches in [first, second]:
+            assert sorted(i for b in batches for i in b) == list(range(len(dset)))
+
+
+def test_window_sampler_reuses_buffers():
+    dset = SequenceDataset(get_sequence_data(nsim=40, nsequences=3), nsteps=2)
+    for stratify in [False, True]:
+        for shuffle in [False, True]:
+            sampler = WindowSampler(dset, 8, shuffle=shuffle, seed=1, stratify=stratify)
+            orders = []
+            for epoch in range(2):
+                sampler.set_epoch(epoch)
+                order = sampler._sample_order()
+                assert order.data_ptr() == sampler._order.data_ptr()
+                orders.append(order.clone())
+            assert torch.equal(orders[0], orders[1]) != shuffle
+            assert sorted(orders[1].tolist()) == list(range(len(dset)))
+
+
+def test_window_sampler_stratifies_by_sequence():
+    dset = SequenceDataset(get_sequence_data(nsim=41, nsequences=2), nsteps=1)
+    for batch in WindowSampler(dset, 10, seed=3, stratify=True, drop_last=True):
+        nfirst = sum(dset._starts[i] < 41 for i in batch)
+        assert 4 <= nfirst <= 6
+
+
+def test_chunked_static_dataset_matches_in_memory(tmp_path):
+    data = get_sequence_data(nsim=250)
+    blocks = ({k: v[i:i + 30] for k, v in data.items()} for i in range(0, 250, 30))
+    write_static_chunks(blocks, str(tmp_path), chunk_size=64)
+    dset = StaticDataset(data, name="train")
+    chunked = ChunkedStaticDataset(str(tmp_path), name="train")
+    assert len(dset) == len(chunked) and chunked.nchunks == 4
+
+    assert_batches_equal(dset[100], chunked[100])
+    assert_batches_equal(dset[[3, 70, 249, 4]], chunked[[3, 70, 249, 4]])
+    assert_batches_equal(dset.get_full_batch(), chunked.get_full_batch())
+
+    sampler = ChunkSampler(chunked, 16, seed=0)
+    batches = list(sampler)
+    assert len(batches) == len(sampler)
+    assert sorted(i for b in batches for i in b) == list(range(250))
+    for b in batches:
+        assert len({i // 64 for i in b}) == 1
+        assert_batches_equal(dset[b], chunked[b])
+
+
+def test_sampled_dataset_is_seeded_and_in_bounds():
+    distributions = {
+        "theta": {"type": "uniform", "low": -1., "high": [1., 2.]},
+        "p": {"type": "normal", "mean": 0., "std": 1., "dim": 3},
+        "s": {"type": "sobol", "low": 0., "high": 1., "dim": 2},
+        "l": {"type": "lhs", "low": [0., -5.], "high": [1., 5.]},
+    }
+    batches = [list(SampledDataset(distributions, batch_size=16, nbatches=3, seed=7)) for _ in range(2)]
+    for b1, b2 in zip(*batches):
+        assert_batches_equal(b1, b2)
+        assert b1["theta"].shape == (16, 2) and b1["p"].shape == (16, 3)
+        assert torch.all(b1["theta"] >= -1) and torch.all(b1["theta"][:, 1] <= 2)
+        assert torch.all((b1["s"] >= 0) & (b1["s"] <= 1))
+        # every stratum of each dimension holds exactly one Latin hypercube sample
+        strata = ((b1["l"] - torch.tensor([0., -5.])) / torch.tensor([1., 10.]) * 16).long()
+        assert all(sorted(strata[:, j].tolist()) == list(range(16)) for j in range(2))
+    assert not torch.equal(batches[0][0]["theta"], batches[0][1]["theta"])
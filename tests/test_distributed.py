@@ -0,0 +1,79 @@
+import os
+import socket
+
+import numpy as np
+import pytest
+import torch
+import torch.distributed as dist
+import torch.nn as nn
+
+from neuromancer.dataset import StaticDataset
+from neuromancer.distributed import DistributedTrainer, get_distributed_dataloader, launch
+from neuromancer.loggers import BasicLogger
+
+NSAMPLES = 10
+
+
+class LinearProblem(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.w = nn.Parameter(torch.ones(3))
+        self.grad_inference = False
+
+    def forward(self, data):
+        loss = ((data["x"] * self.w).sum(-1) - data["y"][:, 0]).pow(2).mean()
+        return {f"{data['name']}_loss": loss}
+
+
+def get_dataset(name):
+    rng = np.random.default_rng(0)
+    return StaticDataset({"i": np.arange(NSAMPLES, dtype=float)[:, None],
+                          "x": rng.random((NSAMPLES, 3)), "y": rng.random((NSAMPLES, 1))}, name=name)
+
+
+def get_free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _train_worker(rank, world_size, tmpdir):
+    torch.manual_seed(0)
+    train_data = get_distributed_dataloader(get_dataset("train"), batch_size=3, shuffle=True)
+    indices = [int(i) for batch in train_data for i in batch["i"][:, 0]]
+
+    problem = LinearProblem()
+    dev_data = get_distributed_dataloader(get_dataset("dev"), batch_size=NSAMPLES)
+    trainer = DistributedTrainer(
+        problem, train_data, dev_data, dev_data, torch.optim.SGD(problem.parameters(), lr=0.1),
+        logger=BasicLogger(savedir=os.path.join(tmpdir, "log"), verbosity=1000, stdout=()),
+        train_metric="train_loss", dev_metric="dev_loss", test_metric="dev_loss", eval_metric="dev_loss",
+        epochs=3, checkpoint_path=os.path.join(tmpdir, f"checkpoint_{rank}.pth"),
+    )
+    metrics = trainer._sync_metrics({"loss": torch.tensor(float(rank)), "steps": torch.tensor(rank), "name": "train"})
+    trainer.train()
+    torch.save({"metrics": metrics, "indices": indices, "w": problem.w.detach()},
+               os.path.join(tmpdir, f"rank_{rank}.pth"))
+
+
+@pytest.mark.skipif(not dist.is_available(), reason="torch.distributed is not available")
+def test_launch_two_processes(tmp_path):
+    launch(_train_worker, 2, str(tmp_path), master_port=get_free_port(), num_threads=1)
+    results = [torch.load(tmp_path / f"rank_{rank}.pth") for rank in range(2)]
+
+    # floating point scalars are averaged over ranks, other entries are left alone
+    for rank, result in enumerate(results):
+        assert result["metrics"]["loss"].item() == 0.5
+        assert result["metrics"]["steps"].item() == rank
+        assert result["metrics"]["name"] == "train"
+
+    # shards are disjoint and together cover the dataset
+    shards = [set(result["indices"]) for result in results]
+    assert not shards[0] & shards[1]
+    assert shards[0] | shards[1] == set(range(NSAMPLES))
+    assert all(len(result["indices"]) == NSAMPLES // 2 for result in results)
+
+    # replicas stay identical and only rank 0 checkpoints
+    assert torch.equal(results[0]["w"], results[1]["w"])
+    assert (tmp_path / "checkpoint_0.pth").exists()
+    assert not (tmp_path / "checkpoint_1.pth").exists()
@@ -0,0 +1,139 @@
+import torch
+import torch.nn as nn
+
+from neuromancer import blocks
+from neuromancer.callbacks import Callback
+from neuromancer.component import Function
+from neuromancer.ensemble import Ensemble, EnsembleCallback
+from neuromancer.loggers import BasicLogger
+from neuromancer.problem import Problem, MSELoss
+from neuromancer.trainer import Trainer
+
+
+def get_problem(seed):
+    torch.manual_seed(seed)
+    func = Function(blocks.MLP(3, 2), input_keys=['x'], output_keys=['fx'], name='mlp')
+    return Problem([MSELoss(['fx_mlp', 'y'])], [], [func])
+
+
+def get_data():
+    return {'x': torch.rand(10, 3), 'y': torch.rand(10, 2), 'name': 'test'}
+
+
+def test_ensemble_matches_members():
+    problems = [get_problem(seed) for seed in range(4)]
+    ensemble = Ensemble(problems)
+    data = get_data()
+    output = ensemble(data)
+    member_outputs = [p(data) for p in problems]
+    for i, member_output in enumerate(member_outputs):
+        assert torch.allclose(output['test_fx_mlp_members'][i], member_output['test_fx_mlp'], atol=1e-6)
+        assert torch.allclose(output['test_loss_members'][i], member_output['test_loss'], atol=1e-6)
+    assert torch.allclose(output['test_loss'], sum(o['test_loss'] for o in member_outputs), atol=1e-6)
+    assert output['test_fx_mlp_std'].shape == (10, 2)
+    assert output['test_x'] is data['x']
+    assert output['test_name'] == 'test'
+
+
+def test_ensemble_member_gradients():
+    problems = [get_problem(seed) for seed in range(3)]
+    ensemble = Ensemble(problems)
+    ensemble(get_data())['test_loss'].backward()
+    for p in ensemble.parameters():
+        assert p.grad is not None and p.grad.shape == p.shape
+
+
+def test_member_state_dict():
+    problems = [get_problem(seed) for seed in range(3)]
+    ensemble = Ensemble(problems)
+    state = ensemble.member_state_dict(1)
+    for k, v in problems[1].state_dict().items():
+        assert torch.equal(state[k], v)
+    problems[0].load_state_dict(state)
+
+
+class ScriptedMember(nn.Module):
+    """
+    Linear least squares model whose dev loss at the i-th evaluation is dev_losses[i].
+    """
+    def __init__(self, w, dev_losses):
+        super().__init__()
+        self.w = nn.Parameter(torch.full((3,), float(w)))
+        self.register_buffer("dev_losses", torch.tensor(dev_losses))
+        self.grad_inference = False
+
+    def forward(self, data):
+        if data["name"] == "dev":
+            return {"dev_loss": (self.dev_losses * data["onehot"]).sum()}
+        return {"train_loss": ((data["x"] * self.w).sum(-1) - data["y"]).pow(2).mean()}
+
+
+class ScriptedDevLoader:
+    """
+    Yields one dev batch selecting the entry of the scripted dev losses for the current evaluation.
+    """
+    def __init__(self, nevals):
+        self.nevals, self.evals = nevals, 0
+
+    def __iter__(self):
+        onehot = torch.zeros(self.nevals)
+        onehot[self.evals] = 1.
+        self.evals += 1
+        yield {"onehot": onehot, "name": "dev"}
+
+    def __len__(self):
+        return 1
+
+
+class MemberRecorder(Callback):
+    """
+    Records member weights and the per member badcount of the EnsembleCallback at the end of every epoch.
+    """
+    def __init__(self):
+        super().__init__()
+        self.weights, self.badcounts = [], {}
+
+    def end_epoch(self, trainer, output):
+        model = trainer.model
+        self.weights.append([model.member_state_dict(i)["w"].clone() for i in range(model.nmembers)])
+        self.badcounts[trainer.current_epoch] = trainer.callback.badcount.tolist()
+
+
+def train_ensemble(dev_losses, tmp_path, **kwargs):
+    ensemble = Ensemble([ScriptedMember(i + 1, losses) for i, losses in enumerate(dev_losses)])
+    recorder = MemberRecorder()
+    train_data = [{"x": torch.rand(4, 3), "y": torch.rand(4), "name": "train"}]
+    trainer = Trainer(
+        ensemble, train_data, ScriptedDevLoader(len(dev_losses[0])), train_data,
+        torch.optim.SGD(ensemble.parameters(), lr=0.1),
+        logger=BasicLogger(savedir=str(tmp_path), verbosity=1000, stdout=()),
+        callback=EnsembleCallback(recorder),
+        train_metric="train_loss", dev_metric="dev_loss", test_metric="train_loss", eval_metric="dev_loss",
+        **kwargs,
+    )
+    best_model = trainer.train()
+    return trainer, best_model, recorder
+
+
+def test_ensemble_callback_keeps_best_weights_of_each_member(tmp_path):
+    trainer, best_model, recorder = train_ensemble([[3., 1., 2., 4., 5.], [3., 4., 5., 2., 6.]], tmp_path,
+                                                   epochs=5, patience=10)
+    assert best_model is trainer.best_model
+    ensemble = trainer.model
+    ensemble.load_state_dict(best_model)
+    # member 0 is best after epoch 1, member 1 after epoch 3
+    for i, epoch in enumerate([1, 3]):
+        assert torch.equal(ensemble.member_state_dict(i)["w"], recorder.weights[epoch][i])
+    assert not torch.equal(recorder.weights[1][1], recorder.weights[3][1])
+
+
+def test_ensemble_callback_member_patience(tmp_path):
+    trainer, _, recorder = train_ensemble([[1., 2., 3., 4., 5.], [1., 2., 0., 3., 4.]], tmp_path,
+                                          epochs=20, eval_every=2, patience=2)
+    # epochs between evaluations count towards each member's patience; member 0 runs out after epoch 5,
+    # member 1 improves at epoch 5 and runs out after epoch 9, when training stops
+    assert {e: recorder.badcounts[e] for e in [1, 3, 5, 7, 9]} == {
+        1: [0, 0], 3: [2, 2], 5: [4, 0], 7: [6, 2], 9: [8, 4],
+    }
+    assert trainer.current_epoch == 9
+    assert len(recorder.weights) == 10
@@ -0,0 +1,81 @@
+import pytest
+import torch
+
+from neuromancer import blocks
+from neuromancer.component import Function
+from neuromancer.problem import Problem, MSELoss
+
+
+def get_problem(output_key='fx'):
+    func = Function(blocks.MLP(3, 2), input_keys=['x'], output_keys=[output_key], name='mlp')
+    return Problem([MSELoss([f'{output_key}_mlp', 'y'])], [], [func])
+
+
+def get_data():
+    return {'x': torch.rand(10, 3), 'y': torch.rand(10, 2), 'name': 'test'}
+
+
+def test_plan_reused():
+    problem = get_problem()
+    data = get_data()
+    first = problem(data)
+    assert len(problem._plans) == 1
+    second = problem(data)
+    assert len(problem._plans) == 1
+    assert first.keys() == second.keys()
+    assert torch.equal(first['test_loss'], second['test_loss'])
+
+
+def test_input_not_modified():
+    problem = get_problem()
+    data = get_data()
+    keys = set(data)
+    problem(data)
+    problem.step(data)
+    problem.calculate_loss(problem.step(data))
+    assert set(data) == keys
+
+
+def test_name_collision_checked():
+    problem = get_problem(output_key='x')
+    data = {**get_data(), 'x_mlp': torch.rand(10, 2)}
+    with pytest.raises(AssertionError):
+        problem(data)
+    assert len(problem._plans) == 0
+
+
+class CountingMLP(torch.nn.Module):
+    def __init__(self, insize, outsize):
+        super().__init__()
+        self.mlp = blocks.MLP(insize, outsize)
+        self.calls = 0
+
+    def forward(self, x):
+        self.calls += 1
+        return self.mlp(x)
+
+
+def get_pruned_problem(outputs):
+    used = Function(CountingMLP(3, 2), input_keys=['x'], output_keys=['fx'], name='used')
+    unused = Function(CountingMLP(3, 2), input_keys=['x'], output_keys=['gx'], name='unused')
+    return Problem([MSELoss(['fx_used', 'y'])], [], [used, unused], outputs=outputs), used.func, unused.func
+
+
+def test_unused_components_pruned():
+    problem, used, unused = get_pruned_problem(outputs=[])
+    output = problem(get_data())
+    assert used.calls == 1 and unused.calls == 0
+    assert set(output) == {'test_loss', 'test_mse_loss'}
+
+
+def test_requested_outputs_by_name():
+    problem, used, unused = get_pruned_problem(outputs={'nstep_train': [], 'loop_dev': ['gx_unused']})
+    data = get_data()
+    problem({**data, 'name': 'nstep_train'})
+    assert unused.calls == 0
+    output = problem({**data, 'name': 'loop_dev'})
+    assert unused.calls == 1
+    assert 'loop_dev_gx_unused' in output and 'loop_dev_fx_used' not in output
+    output = problem({**data, 'name': 'test'})
+    assert unused.calls == 2
+    assert 'test_x' in output
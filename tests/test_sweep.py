@@ -0,0 +1,75 @@
+from argparse import Namespace
+import time
+
+import numpy as np
+import torch
+
+from neuromancer import arg
+from neuromancer.sweep import grid_search, random_search, run_sweep, Trial
+
+
+def test_grid_search_combinations():
+    trials = grid_search({'lr': [0.1, 0.01], 'nsteps': [8, 16, 32], 'epochs': 10})
+    assert len(trials) == 6
+    assert all(t['epochs'] == 10 for t in trials)
+    assert {(t['lr'], t['nsteps']) for t in trials} == {(lr, n) for lr in [0.1, 0.01] for n in [8, 16, 32]}
+
+
+def test_random_search_seeded():
+    space = {'lr': lambda rng: 10 ** rng.uniform(-4, -2), 'nsteps': [8, 16], 'epochs': 10}
+    trials = random_search(space, 20, seed=3)
+    assert trials == random_search(space, 20, seed=3)
+    assert all(1e-4 <= t['lr'] <= 1e-2 and t['nsteps'] in [8, 16] and t['epochs'] == 10 for t in trials)
+
+
+def test_arg_groups():
+    parser = arg.ArgParser(parents=[arg.log(), arg.opt()])
+    args = Namespace(**{**vars(parser.parse_args([])), 'lr': 0.5})
+    groups = parser.arg_groups(args)
+    assert groups['OPTIMIZATION'].lr == 0.5
+    assert groups['LOGGING'].savedir == args.savedir
+
+
+def test_trial_median_pruning():
+    history = {}
+    trials = [Trial(i, {}, Namespace(), {}, history=history, min_trials=3) for i in range(4)]
+    for trial, best in zip(trials[:3], [1.0, 2.0, 3.0]):
+        assert not trial.report(0, best)
+    assert trials[3].report(0, 2.5)
+    assert not trials[3].report(0, 1.5)
+    assert trials[3].report(0, 1.5, minimize=False)
+
+
+def _train_trial(trial):
+    if trial.args.lr < 0:
+        raise ValueError("negative learning rate")
+    if trial.args.lr > 1:
+        # wait until the other trials have reported so that this one is compared against them
+        deadline = time.time() + 60
+        while len(trial.history) < 3 and time.time() < deadline:
+            time.sleep(0.05)
+    trial.pruned = trial.report(0, trial.args.lr)
+    return {"loss": torch.tensor(trial.args.lr * trial.args.nsteps), "threads": torch.get_num_threads(),
+            "curve": torch.rand(3)}
+
+
+def test_run_sweep():
+    parser = arg.ArgParser(parents=[arg.opt(), arg.data()])
+    trials = [{'lr': 0.1, 'nsteps': n} for n in [8, 16, 32]] + [{'lr': 10., 'nsteps': 8}, {'lr': -1., 'nsteps': 8}]
+    results = run_sweep(_train_trial, parser, trials, workers=2, num_threads=3, min_trials=3)
+    assert len(results) == len(trials)
+    results = results.set_index('trial').sort_index()
+    assert list(results.index) == list(range(len(trials)))
+    assert {'lr', 'nsteps', 'loss', 'threads', 'pruned', 'error'} <= set(results.columns)
+    assert 'curve' not in results.columns
+
+    ok = results.iloc[:4]
+    assert ok['error'].isna().all()
+    assert np.allclose(ok['loss'], [0.8, 1.6, 3.2, 80.])
+    assert (ok['threads'] == 3).all()
+    # only the trial worse than the median of the three others reported through the shared history is pruned
+    assert list(ok['pruned']) == [False, False, False, True]
+
+    failed = results.iloc[4]
+    assert 'negative learning rate' in failed['error']
+    assert np.isnan(failed['loss']) and not failed['pruned']
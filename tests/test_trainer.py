@@ -0,0 +1,332 @@
+import threading
+
+import pytest
+import torch
+import torch.nn as nn
+
+from neuromancer import trainer as trainer_module
+from neuromancer.callbacks import Callback
+from neuromancer.loggers import BasicLogger
+from neuromancer.trainer import Prefetcher, ResidentLoader, Trainer, _clone_state_dict, _copy_state_dict_
+
+
+class StubProblem(nn.Module):
+    """
+    Linear least squares problem. Dev losses can be scripted to control early stopping.
+    """
+    def __init__(self, dev_losses=None):
+        super().__init__()
+        self.w = nn.Parameter(torch.ones(3))
+        self.grad_inference = False
+        self.dev_losses = dev_losses
+        self.nevals = 0
+
+    def forward(self, data):
+        loss = ((data["x"] * self.w).sum(-1) - data["y"]).pow(2).mean()
+        if data["name"] == "dev" and self.dev_losses is not None:
+            loss = torch.tensor(self.dev_losses[self.nevals])
+            self.nevals += 1
+        return {f"{data['name']}_loss": loss}
+
+
+class MutatingProblem(StubProblem):
+    """
+    Adds a key to the data dictionary during the forward pass, as e.g. Variables do.
+    """
+    def forward(self, data):
+        assert "added" not in data
+        data["added"] = data["name"]
+        return super().forward(data)
+
+
+class CountingLoader:
+    """
+    Counts how often a list of batches is iterated.
+    """
+    def __init__(self, batches):
+        self.batches, self.iterations = batches, 0
+
+    def __iter__(self):
+        self.iterations += 1
+        return iter(self.batches)
+
+    def __len__(self):
+        return len(self.batches)
+
+
+def get_data(name, nbatches=1, seed=0):
+    gen = torch.Generator().manual_seed(seed)
+    return [{"x": torch.rand(4, 3, generator=gen), "y": torch.rand(4, generator=gen), "name": name}
+            for _ in range(nbatches)]
+
+
+def get_trainer(problem, tmp_path, train_data=None, lr=0.1, optimizer=torch.optim.SGD, **kwargs):
+    return Trainer(
+        problem,
+        train_data if train_data is not None else get_data("train"),
+        get_data("dev"),
+        get_data("test"),
+        optimizer(problem.parameters(), lr=lr),
+        logger=BasicLogger(savedir=str(tmp_path), verbosity=1000, stdout=()),
+        train_metric="train_loss",
+        dev_metric="dev_loss",
+        test_metric="test_loss",
+        eval_metric="dev_loss",
+        **kwargs,
+    )
+
+
+class RecordingCallback(Callback):
+    """
+    Records the evaluated epochs, and the badcount and weights at the end of every epoch.
+    """
+    def __init__(self):
+        super().__init__()
+        self.evals, self.badcounts, self.weights = [], [], []
+
+    def end_eval(self, trainer, output):
+        self.evals.append(trainer.current_epoch)
+
+    def end_epoch(self, trainer, output):
+        self.badcounts.append(trainer.badcount)
+        self.weights.append(trainer.model.w.detach().clone())
+
+
+def get_batches(n=5):
+    return [{"x": torch.full((2, 3), float(i)), "name": "train"} for i in range(n)]
+
+
+class FailingLoader:
+    def __init__(self, batches, fail_at):
+        self.batches, self.fail_at = batches, fail_at
+
+    def __iter__(self):
+        for i, batch in enumerate(self.batches):
+            if i == self.fail_at:
+                raise ValueError("loader failed")
+            yield batch
+
+    def __len__(self):
+        return len(self.batches)
+
+
+class EndlessLoader:
+    def __iter__(self):
+        i = 0
+        while True:
+            yield {"x": torch.tensor([float(i)])}
+            i += 1
+
+    def __len__(self):
+        return 0
+
+
+def test_prefetcher_preserves_order():
+    batches = get_batches()
+    for depth in [1, 3]:
+        prefetched = list(Prefetcher(batches, depth=depth))
+        assert len(prefetched) == len(batches)
+        for b1, b2 in zip(prefetched, batches):
+            assert torch.equal(b1["x"], b2["x"]) and b1["name"] == b2["name"]
+
+
+def test_prefetcher_transform():
+    prefetched = list(Prefetcher(get_batches(), transform=lambda b: {**b, "x": b["x"] + 1}))
+    assert all(torch.equal(b["x"], torch.full((2, 3), i + 1.)) for i, b in enumerate(prefetched))
+
+
+def test_prefetcher_raises_loader_exception():
+    batches = iter(Prefetcher(FailingLoader(get_batches(), fail_at=2)))
+    assert torch.equal(next(batches)["x"], get_batches()[0]["x"])
+    assert torch.equal(next(batches)["x"], get_batches()[1]["x"])
+    with pytest.raises(ValueError, match="loader failed"):
+        next(batches)
+
+
+def test_prefetcher_thread_stops_on_early_exit():
+    nthreads = threading.active_count()
+    batches = iter(Prefetcher(EndlessLoader(), depth=2))
+    for _ in range(3):
+        next(batches)
+    assert threading.active_count() == nthreads + 1
+    batches.close()
+    assert threading.active_count() == nthreads
+
+
+def test_gradient_accumulation_uses_mean_gradient_of_each_step(tmp_path):
+    batches = get_data("train", nbatches=3)
+    problem = StubProblem()
+    get_trainer(problem, tmp_path, train_data=batches, epochs=1, accumulate_steps=2).train()
+
+    reference = StubProblem()
+    optimizer = torch.optim.SGD(reference.parameters(), lr=0.1)
+    # two full micro-batches, then the leftover one with its full gradient
+    for group in [batches[:2], batches[2:]]:
+        (sum(reference(b)["train_loss"] for b in group) / len(group)).backward()
+        optimizer.step()
+        optimizer.zero_grad()
+    assert torch.allclose(problem.w, reference.w)
+
+
+def test_accumulate_steps_must_be_positive(tmp_path):
+    with pytest.raises(AssertionError):
+        get_trainer(StubProblem(), tmp_path, accumulate_steps=0)
+
+
+def test_resume_restores_training_state(tmp_path):
+    path = str(tmp_path / "checkpoint.pth")
+    # epochs 0 and 1 improve, the final epoch 2 does not: badcount 1, adaptive interval doubled to 2
+    trainer = get_trainer(StubProblem([3., 2., 4.]), tmp_path, optimizer=torch.optim.Adam, epochs=3, patience=4,
+                          adaptive_eval=True, checkpoint_path=path)
+    trainer.train()
+
+    problem = StubProblem([5., 6.])
+    resumed = get_trainer(problem, tmp_path, optimizer=torch.optim.Adam, epochs=6, patience=4,
+                          adaptive_eval=True).resume(path)
+    assert resumed.start_epoch == 3
+    assert resumed.best_devloss == 2.
+    assert resumed.badcount == 1
+    assert all(torch.equal(v, trainer.best_model[k]) for k, v in resumed.best_model.items())
+    assert torch.equal(problem.w, trainer.model.w)
+    state, expected = resumed.optimizer.state_dict()["state"], trainer.optimizer.state_dict()["state"]
+    assert state.keys() == expected.keys()
+    for k in state:
+        assert all(torch.equal(torch.as_tensor(state[k][n]), torch.as_tensor(expected[k][n])) for n in state[k])
+
+    # the doubled interval carries over: evaluations at epochs 4 and 5 (final) rather than 3, 4 and 5
+    resumed.train()
+    assert problem.nevals == 2
+    assert resumed.badcount == 1 + 2 + 1
+
+
+def test_eval_every_counts_unevaluated_epochs_towards_patience(tmp_path):
+    callback = RecordingCallback()
+    trainer = get_trainer(StubProblem([1., 2., 3., 4.]), tmp_path, callback=callback, epochs=20,
+                          eval_every=3, patience=2)
+    trainer.train()
+    # epoch 2 improves, epoch 5 does not: the 3 epochs since the last evaluation exceed patience
+    assert callback.evals == [2, 5]
+    assert callback.badcounts == [0, 0, 0, 0, 0, 3]
+    assert trainer.current_epoch == 5
+
+
+def test_eval_every_one_matches_per_epoch_badcount(tmp_path):
+    callback = RecordingCallback()
+    trainer = get_trainer(StubProblem([5., 4., 6., 7., 3., 8., 9., 9., 9., 9.]), tmp_path, callback=callback,
+                          epochs=10, eval_every=1, patience=3, warmup=2)
+    trainer.train()
+    # badcount incremented once per epoch without improvement after warmup, reset on improvement
+    assert callback.evals == list(range(9))
+    assert callback.badcounts == [0, 0, 0, 1, 0, 1, 2, 3, 4]
+
+
+def test_adaptive_eval_doubles_interval_and_evaluates_last_epoch(tmp_path):
+    callback = RecordingCallback()
+    trainer = get_trainer(StubProblem([1., 2., 3., 0., 4., 5., 6.]), tmp_path, callback=callback, epochs=13,
+                          patience=8, adaptive_eval=True)
+    trainer.train()
+    # interval 1 -> 2 -> 4 after two evaluations without improvement, reset by the improvement at epoch 7,
+    # doubled again after epochs 8 and 10, and the final epoch is evaluated although the next is due at 14
+    assert callback.evals == [0, 1, 3, 7, 8, 10, 12]
+
+
+def test_best_model_buffer_holds_best_epoch_weights(tmp_path):
+    callback = RecordingCallback()
+    trainer = get_trainer(StubProblem([2., 1., 3., 4.]), tmp_path, callback=callback, epochs=4, patience=10)
+    buffer = trainer.best_model
+    weights = buffer["w"]
+    best_model = trainer.train()
+    # updated in place: the dict and its tensors are those allocated in __init__
+    assert best_model is buffer and best_model["w"] is weights
+    assert torch.equal(best_model["w"], callback.weights[1])
+    assert not torch.equal(best_model["w"], trainer.model.w)
+    assert best_model["w"].data_ptr() != trainer.model.w.data_ptr()
+
+
+def test_copy_state_dict_replaces_changed_entries():
+    src = torch.nn.Linear(3, 2).state_dict()
+    dst = _clone_state_dict(src)
+    assert dst._metadata == src._metadata
+    assert all(torch.equal(dst[k], v) and dst[k].data_ptr() != v.data_ptr() for k, v in src.items())
+
+    weight, bias = dst["weight"], dst["bias"]
+    changed = {"weight": torch.rand(2, 3), "bias": torch.rand(2, dtype=torch.float64), "scale": torch.rand(4), "n": 3}
+    _copy_state_dict_(dst, changed)
+    # same shape and dtype is copied in place; changed dtypes and new entries are replaced by copies
+    assert dst["weight"] is weight and torch.equal(weight, changed["weight"])
+    assert dst["bias"] is not bias
+    for k in ["bias", "scale"]:
+        assert torch.equal(dst[k], changed[k]) and dst[k].dtype == changed[k].dtype
+        assert dst[k].data_ptr() != changed[k].data_ptr()
+    assert dst["n"] == 3
+
+    _copy_state_dict_(dst, {"scale": torch.rand(5)})
+    assert dst["scale"].shape == (5,)
+
+
+def test_resident_loader_prepares_batches_once(tmp_path, monkeypatch):
+    moves = []
+    move = trainer_module.move_batch_to_device
+
+    def counting_move(batch, *args, **kwargs):
+        moves.append(batch)
+        return move(batch, *args, **kwargs)
+
+    monkeypatch.setattr(trainer_module, "move_batch_to_device", counting_move)
+    loader = CountingLoader(get_data("train", nbatches=3))
+    resident = ResidentLoader(loader)
+    for _ in range(3):
+        for batch in resident:
+            batch["added"] = True
+    assert loader.iterations == 1 and len(moves) == 3
+    assert all("added" not in batch for batch in resident)
+
+    loader = CountingLoader(get_data("train", nbatches=3))
+    moves.clear()
+    get_trainer(MutatingProblem(), tmp_path, train_data=loader, epochs=4, resident_data=True).train()
+    assert loader.iterations == 1
+    # 3 train batches, 1 dev batch and 1 test batch moved once at construction
+    assert len(moves) == 5
+
+
+def test_resident_data_matches_default_training(tmp_path):
+    batches = get_data("train", nbatches=3)
+    weights = []
+    for resident_data in [False, True]:
+        problem = MutatingProblem()
+        get_trainer(problem, tmp_path, train_data=batches, epochs=3, resident_data=resident_data).train()
+        weights.append(problem.w.detach())
+    assert torch.equal(*weights)
+
+
+class LossRecorder(Callback):
+    """
+    Records per batch training losses and the mean training loss of every epoch.
+    """
+    def __init__(self):
+        super().__init__()
+        self.batch_losses, self.means = [], []
+
+    def end_batch(self, trainer, output):
+        self.batch_losses.append(output["train_loss"].item())
+
+    def begin_epoch(self, trainer, output):
+        self.means.append(output["mean_train_loss"])
+
+
+def test_mean_metrics_are_detached_batch_means(tmp_path):
+    callback = LossRecorder()
+    problem = StubProblem()
+    batches = get_data("train", nbatches=4)
+    trainer = get_trainer(problem, tmp_path, train_data=batches, callback=callback, epochs=1)
+    best_model = trainer.train()
+    mean = callback.means[0]
+    assert not mean.requires_grad
+    assert torch.isclose(mean, torch.tensor(sum(callback.batch_losses) / len(batches)))
+
+    output = trainer.test(best_model)
+    with torch.no_grad():
+        expected = sum(problem(b)["train_loss"] for b in batches) / len(batches)
+    assert not output["mean_train_loss"].requires_grad
+    assert torch.isclose(output["mean_train_loss"], expected)
+    assert not output["mean_dev_loss"].requires_grad